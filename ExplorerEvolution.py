@@ -2,25 +2,54 @@ import sys
 import random
 import math
 import os
-with open(os.devnull, 'w') as f: #This disables stdout when importing pygame to fix an issue where it repeatedly outputs a welcome message.
-                                 #This is likely the result of multi-threading, but further investigation is needed.
-    # disable stdout
-    oldstdout = sys.stdout
-    sys.stdout = f
-
-    import pygame
-
-    # enable stdout
-    sys.stdout = oldstdout
-
-import ctypes
-from fractions import Fraction
-from collections import Counter
+from array import array
+from collections import OrderedDict
+import hashlib
 import threading
 import multiprocessing
+import multiprocessing.shared_memory
+import concurrent.futures
 import time
+import mmap
+import struct
+import json
+import queue
+import socket
+import select
+import argparse
+try:
+    import numpy #Optional. Only needed for the "numpy" simulator.
+except ImportError:
+    numpy = None
+
+pygame = None #Imported by importVisualizerModules, so worker processes and headless runs never load it
+ctypes = None #Imported by importVisualizerModules
+fitnessQueue = None #A queue accessible to all worker processes. Created by getFitnessQueue on first use.
 
-fitnessQueue = multiprocessing.Queue() #Creates a queue accessible to all threads 
+def importVisualizerModules():
+    "Imports the modules only the visualizer needs, if they haven't been imported yet"
+    global pygame, ctypes
+    if pygame != None:
+        return
+    with open(os.devnull, 'w') as f: #This disables stdout when importing pygame to hide its welcome message
+        # disable stdout
+        oldstdout = sys.stdout
+        sys.stdout = f
+        try:
+            import pygame as pygameModule
+        finally:
+            # enable stdout
+            sys.stdout = oldstdout
+    import ctypes as ctypesModule
+    pygame = pygameModule
+    ctypes = ctypesModule
+
+def getFitnessQueue():
+    "Returns the queue that worker processes started without the persistent worker pool send their fitnesses through, creating it on first use"
+    global fitnessQueue
+    if fitnessQueue == None:
+        fitnessQueue = multiprocessing.Queue()
+    return fitnessQueue
 
 
 class StateMachine:
@@ -31,16 +60,19 @@ class StateMachine:
         self.removedStateIds = [] #List of IDs that have become available
         self.currentState = 0 #The current state of the machine
         self.highestId = len(statesDict)-1 #The highest identifier in use or in the removedStateIds list
+        self.compiled = None #The CompiledStateMachine for the current States, or None if it hasn't been built since the last change
+        self.fieldFitness = {} #Fitnesses of this StateMachine keyed to fitness keys, stored by Evolutions using a fixed set of Fields. Cleared whenever the States change.
         
     def getNewId(self):
         "Returns a unique identifier not in use in this StateMachine"
         if len(self.removedStateIds) > 0:
             return self.removedStateIds.pop(0)
-        return len(self.statesDict)
+        return self.highestId + 1
     
     def removeState(self, identifier):
         "Removes the State with the given identifier, unless the identifier equals 0"
         if identifier != 0: #Cannot remove the starting state
+            self.invalidate()
             self.removedStateIds.append(identifier)
             self.statesDict.pop(identifier)
             if self.highestId == identifier:
@@ -83,7 +115,8 @@ class StateMachine:
         return self.statesDict.get(self.currentState)
     
     def replaceOrAddState(self, newState):
-        "Adds the newState to the StateMachine if the State's identifier is unique, otherwise replaces the State with the same identifier"
+        "Adds the newState to the StateMachine if the State's identifier is unique, otherwise replaces the State with the same identifier. Replacing a State with an equal one doesn't mark the StateMachine as changed."
+        unchanged = self.statesDict.get(newState.identifier) == newState
         if newState.identifier in self.removedStateIds:
             self.removedStateIds.remove(newState.identifier)
         if newState.identifier > self.highestId:
@@ -91,9 +124,11 @@ class StateMachine:
                 self.removedStateIds.append(i)
             self.highestId = newState.identifier
         self.statesDict[newState.identifier] = newState
+        if not unchanged:
+            self.invalidate()
         
     def purgeIslands(self):
-        "Removes all unreachable States"
+        "Removes all unreachable States and makes their identifiers available again"
         stateHitCounter = {}
         for key in self.statesDict.keys():
             stateHitCounter[key] = 0
@@ -101,15 +136,72 @@ class StateMachine:
         for state, hits in stateHitCounter.items():
             if hits == 0:
                 self.statesDict.pop(state)
+        self.highestId = max(self.statesDict.keys())
+        self.removedStateIds = [i for i in range(0, self.highestId) if i not in self.statesDict]
+        self.invalidate()
                 
     def recursiveGroom(self, stateHitCounter, stateId):
-        "Modifies the given stateHitCounter dictionary (containing State identifiers as keys paired with a value of 0) to add 1 to all values for reachable States"
-        if stateId in stateHitCounter.keys():
-            if stateHitCounter.get(stateId) < 1:
+        "Modifies the given stateHitCounter dictionary (containing State identifiers as keys paired with a value of 0) to add 1 to all values for States reachable from the given State. Uses an explicit stack rather than recursion, so it works for any number of States."
+        stack = [stateId]
+        while len(stack) > 0:
+            stateId = stack.pop()
+            if stateHitCounter.get(stateId, 1) < 1:
                 stateHitCounter[stateId] += 1
-                self.recursiveGroom(stateHitCounter, self.statesDict.get(stateId).nextState)
-                self.recursiveGroom(stateHitCounter, self.statesDict.get(stateId).blockedState)
-                self.recursiveGroom(stateHitCounter, self.statesDict.get(stateId).breakState)
+                state = self.statesDict.get(stateId)
+                stack.append(state.breakState)
+                stack.append(state.blockedState)
+                stack.append(state.nextState)
+                
+    def canonicalize(self):
+        "Removes unreachable States, merges States that always behave the same, and renumbers the remaining States 0, 1, 2... in breadth-first order from the zero State. States are merged by partition refinement when they have the same value and breakAfter and their transitions lead to merged States. States that break after more than 1 hit are never merged, since merging them would share their hit counts."
+        compiled = self.getCompiled()
+        stateTotal = len(compiled.values)
+        transitions = [(compiled.nextStates[i], compiled.blockedStates[i], compiled.breakStates[i]) for i in range(stateTotal)]
+        #Start with one block per value and breakAfter, with each State that counts hits in its own block
+        blocks = StateMachine.numberByFirstOccurrence([(compiled.values[i], compiled.breakAfters[i], i if compiled.breakAfters[i] > 1 else -1) for i in range(stateTotal)])
+        blockCount = max(blocks) + 1
+        while True: #split blocks until every State in a block transitions to the same blocks
+            blocks = StateMachine.numberByFirstOccurrence([(blocks[i],) + tuple(blocks[t] for t in transitions[i]) for i in range(stateTotal)])
+            if max(blocks) + 1 == blockCount:
+                break
+            blockCount = max(blocks) + 1
+        representatives = {} #first State of each block, keyed to the block
+        for i in range(stateTotal - 1, -1, -1):
+            representatives[blocks[i]] = i
+        newIds = {blocks[0]: 0} #new identifier of each block, in breadth-first order
+        order = [blocks[0]]
+        for block in order: #order grows while it is being traversed
+            representative = representatives[block]
+            for target in transitions[representative]: #transitions that can't be taken are 0, which is already numbered
+                if blocks[target] not in newIds:
+                    newIds[blocks[target]] = len(order)
+                    order.append(blocks[target])
+        newStatesDict = {}
+        for block in order:
+            i = representatives[block]
+            nextState, blockedState, breakState = (newIds[blocks[t]] for t in transitions[i])
+            newStatesDict[newIds[block]] = State(nextState, blockedState, breakState, compiled.breakAfters[i], compiled.values[i], newIds[block])
+        self.statesDict = newStatesDict
+        self.removedStateIds = []
+        self.highestId = len(newStatesDict)-1
+        self.currentState = 0
+        self.invalidate()
+        
+    def numberByFirstOccurrence(items):
+        "Returns a list giving each item the number of the first distinct item equal to it, counting from 0"
+        numbers = {}
+        return [numbers.setdefault(item, len(numbers)) for item in items]
+        
+    def getCompiled(self):
+        "Returns the CompiledStateMachine for this StateMachine, building it if the States have changed since it was last built"
+        if self.compiled == None:
+            self.compiled = CompiledStateMachine(self)
+        return self.compiled
+    
+    def invalidate(self):
+        "Discards the CompiledStateMachine and stored fitnesses, marking the StateMachine as changed. Must be called after States are added, removed, or modified directly."
+        self.compiled = None
+        self.fieldFitness = {}
                 
     def getNextValue(self):
         "Transitions the current State to its next State and returns the value of that State"
@@ -133,6 +225,44 @@ class StateMachine:
             string = string + self.statesDict.get(key).toString() + ", "
         return string + "}"
     
+    def toJson(self):
+        "Returns a JSON string holding the States of this StateMachine and its free identifiers"
+        states = [[state.identifier, state.nextState, state.blockedState, state.breakState, state.breakAfter, state.value] for state in self.statesDict.values()]
+        return json.dumps({"states": states, "removedStateIds": self.removedStateIds, "highestId": self.highestId})
+
+    def toBytes(self):
+        "Returns a compact binary representation of this StateMachine: the number of States, the number of free identifiers, and highestId, followed by each State and each free identifier"
+        data = bytearray(struct.pack("<iii", len(self.statesDict), len(self.removedStateIds), self.highestId))
+        for state in self.statesDict.values():
+            data += state.toBytes()
+        data += struct.pack("<" + str(len(self.removedStateIds)) + "i", *self.removedStateIds)
+        return bytes(data)
+
+    def fromBytes(data):
+        "Returns a new StateMachine from bytes created by toBytes"
+        stateCount, removedCount, highestId = struct.unpack_from("<iii", data)
+        offset = struct.calcsize("<iii")
+        statesDict = {}
+        for i in range(0, stateCount):
+            state = State.fromBytes(data, offset)
+            statesDict[state.identifier] = state
+            offset += State.byteSize
+        machine = StateMachine(statesDict)
+        machine.removedStateIds = list(struct.unpack_from("<" + str(removedCount) + "i", data, offset))
+        machine.highestId = highestId
+        return machine
+
+    def fromJson(text):
+        "Returns a new StateMachine from a JSON string created by toJson"
+        data = json.loads(text)
+        statesDict = {}
+        for identifier, nextState, blockedState, breakState, breakAfter, value in data["states"]:
+            statesDict[identifier] = State(nextState, blockedState, breakState, breakAfter, value, identifier)
+        machine = StateMachine(statesDict)
+        machine.removedStateIds = list(data["removedStateIds"])
+        machine.highestId = data["highestId"]
+        return machine
+    
     def copyMachine(self):
         "Constructs and returns a copy of this StateMachine"
         newStateDict = {}
@@ -140,8 +270,15 @@ class StateMachine:
             newStateDict[ident] = state.copyState()
         newMachine = StateMachine(newStateDict)
         newMachine.removedStateIds = list(self.removedStateIds)
+        newMachine.fieldFitness = dict(self.fieldFitness) #the copy behaves the same until it is changed
         return newMachine
     
+    def __getstate__(self):
+        "Leaves out the stored fitnesses when pickling, since worker processes don't need them"
+        state = self.__dict__.copy()
+        state["fieldFitness"] = {}
+        return state
+
     def resetStates(self):
         "Sets the hit count of all States to 0"
         for ident, state in self.statesDict.items():
@@ -160,8 +297,13 @@ class StateMachine:
 
 class State:
     "A state in a state machine"
+    __slots__ = ("nextState", "blockedState", "value", "identifier", "breakState", "breakAfter", "hitCount") #no per-instance __dict__, since populations hold many States
     values = 8 #Valid state values are 1 through 8
     valueDictionary = {1:'up', 2:'up-right', 3:'right', 4:'down-right', 5:'down', 6:'down-left', 7:'left', 8:'up-left'} #value meanings
+    xMoves = (0, 0, 1, 1, 1, 0, -1, -1, -1) #Change in x for each value, indexed by value
+    yMoves = (0, 1, 1, 0, -1, -1, -1, 0, 1) #Change in y for each value, indexed by value
+    packer = struct.Struct("<iiiiib") #Binary layout of a State: identifier, nextState, blockedState, breakState, breakAfter, value
+    byteSize = packer.size #The number of bytes in the binary representation of a State
     
     def __init__(self, nextState, blockedState, breakState, breakAfter, value, identifier):
         "Constructor"
@@ -191,6 +333,86 @@ class State:
         "Constructs and returns a copy of this State object"
         return State(self.nextState, self.blockedState, self.breakState, self.breakAfter, self.value, self.identifier)
 
+    def toBytes(self):
+        "Returns a compact binary representation of this State"
+        return State.packer.pack(self.identifier, self.nextState, self.blockedState, self.breakState, self.breakAfter, self.value)
+
+    def fromBytes(data, offset = 0):
+        "Returns a new State from the bytes created by toBytes at the given offset in data"
+        identifier, nextState, blockedState, breakState, breakAfter, value = State.packer.unpack_from(data, offset)
+        return State(nextState, blockedState, breakState, breakAfter, value, identifier)
+
+
+class CompiledStateMachine:
+    "An array-based form of a StateMachine for fast execution. Reachable States are renumbered to contiguous indices in breadth-first order from the zero State, which gets index 0."
+    def __init__(self, stateMachine):
+        "Constructor"
+        statesDict = stateMachine.statesDict
+        indices = {0: 0} #Index of each reachable State keyed to its ID
+        stateIds = [0] #ID of the State at each index
+        for stateId in stateIds: #stateIds grows while it is being traversed
+            for target in CompiledStateMachine.getTransitions(statesDict.get(stateId)):
+                if target not in statesDict: #transitions to missing States go to the zero State
+                    target = 0
+                if target not in indices:
+                    indices[target] = len(stateIds)
+                    stateIds.append(target)
+        states = [statesDict.get(stateId) for stateId in stateIds]
+        self.stateIds = stateIds #ID of the State at each index
+        #Transitions that can never be taken are stored as 0, so equivalent machines get identical tables
+        self.nextStates = array('i', [indices.get(s.nextState, 0) if s.breakAfter < 0 or s.breakAfter > 1 else 0 for s in states]) #Index of the next State of each State
+        self.blockedStates = array('i', [indices.get(s.blockedState, 0) if s.breakAfter < 0 or s.breakAfter > 1 else 0 for s in states]) #Index of the blocked State of each State
+        self.breakStates = array('i', [indices.get(s.breakState, 0) if s.breakAfter > -1 else 0 for s in states]) #Index of the break State of each State
+        self.breakAfters = array('i', [s.breakAfter if s.breakAfter != 1 else 0 for s in states]) #breakAfter of each State. 1 is stored as 0 since both break on every hit.
+        self.values = array('i', [s.value for s in states]) #Value of each State
+        self.hitCounts = array('i', [0]*len(states)) #Hit count of each State
+        self.stateCount = len(statesDict) #Number of States in the StateMachine, including unreachable ones
+        tables = (self.nextStates, self.blockedStates, self.breakStates, self.breakAfters, self.values)
+        self.fingerprint = hashlib.blake2b(b"".join(table.tobytes() for table in tables), digest_size=16).digest() #Identical for StateMachines with the same reachable behavior and structure, regardless of State identifiers
+        
+    def getTransitions(state):
+        "Returns the identifiers of the States that the given State can transition to. A State without a breakAfter point never breaks, and a State that breaks after 0 or 1 hits always breaks."
+        if state.breakAfter < 0:
+            return (state.nextState, state.blockedState)
+        if state.breakAfter <= 1:
+            return (state.breakState,)
+        return (state.nextState, state.blockedState, state.breakState)
+        
+    def resetHitCounts(self):
+        "Sets the hit count of all States to 0"
+        self.hitCounts = array('i', [0]*len(self.values))
+
+
+class FitnessCache:
+    "A size-bounded cache of fitnesses that evicts the least recently used entry when full"
+    def __init__(self, maxSize):
+        "Constructor"
+        self.maxSize = maxSize #The maximum number of fitnesses kept
+        self.entries = OrderedDict() #Fitnesses keyed to fitness keys, from least to most recently used
+        self.hits = 0 #The number of lookups that found a fitness
+        self.misses = 0 #The number of lookups that didn't find a fitness
+        
+    def get(self, key):
+        "Returns the fitness stored for the key, or None if there isn't one"
+        fitness = self.entries.get(key)
+        if fitness == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return fitness
+        
+    def put(self, key, fitness):
+        "Stores the fitness for the key, evicting the least recently used fitness if the cache is full"
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+            
+    def __len__(self):
+        "Returns the number of fitnesses stored"
+        return len(self.entries)
+
 
 class Evolution:
     "Evolves a population to develop more advanced individuals or solutions"
@@ -205,11 +427,18 @@ class Evolution:
         self.maxFitness = 0 #The max fitness in the current generation
         self.maxStartingSize = 20 #Maximum number of states in initial individuals
         self.field = None #The Field used for evaluation
+        self.fieldId = 0 #Identifies the current evaluation Field. Changes whenever a new Field is generated.
+        self.fieldsGenerated = 0 #The number of evaluation Fields generated
+        self.fieldCorpus = None #A FieldCorpus that evaluation Fields are drawn from, or None to generate a new Field for every sample
+        self.fixedFieldCount = 0 #If above 0, generateField only generates this many Fields and then cycles through them. Set it to evalSample to evaluate every generation on the same Fields.
+        self.fixedFields = [] #The (Field, starting position, Field id) of each Field generated while fixedFieldCount is above 0
+        self.fixedFieldIndex = 0 #The number of Fields taken by generateField while fixedFieldCount is above 0
         self.startingPosition = None #The starting position in the evaluation Field
         self.fieldWidth = 480 #The width of the evaluation Field
         self.fieldHeight = 270 #The height of the evaluation Field
         self.fieldBorderValue = 1 #The value representing the border of the evaluation Field
         self.fieldObstacleFillerValue = 2 #The value representing the inside of obstacles in the evaluation Field
+        self.fieldObstacleMaxSides = 2 #Each obstacle gets a random number of sides from 1 to this value. Obstacles with fewer than 3 sides are circles, the rest are polygons.
         self.highPop = [] #A list containing population members with high fitnesses relative to the rest of the population
         self.lowPop = [] #A list containing population members with low fitnesses relative to the rest of the population
         self.selectionPercentile = 30 #Percent of individuals in the highPop list
@@ -217,12 +446,49 @@ class Evolution:
         self.mutationRate = 0.1 #The probability an individual will be mutated
         self.carryOver = 0.75 #Fraction of new individuals in each generation
         self.evalSample = 10 #Number of random Fields to evaluate each individual against when determining fitness
+        self.successiveHalving = False #True if only the fittest individuals should get the full evalSample and evalMovements budget, as described in evaluateSamplesByHalving
+        self.halvingRounds = 3 #The number of successive halving rounds. The first round uses halvingKeepFraction**(halvingRounds-1) of the Fields and movements.
+        self.halvingKeepFraction = 0.5 #The fraction of individuals promoted to the next successive halving round
         self.evalsDone = 0 #The number of fitness evaluations done
+        self.individualsSimulated = 0 #The number of times an individual has been simulated on a Field
+        self.stepsSimulated = 0 #The number of movements simulated in all evaluations, including those done in worker processes
+        self.fitnessesReused = 0 #The number of fitnesses taken from those stored on unchanged individuals instead of being simulated or looked up in fitnessCache
         self.evaluationBlockedShortcut = True #True if the fitness evaluation should stop prematurely if the individual may be blocked
+        self.canonicalizeOffspring = False #True if new individuals should be canonicalized, making them smaller and faster to copy and send to workers. This also changes which States crossover pairs up.
+        self.simulator = "python" #"python" to evaluate individuals one at a time with evaluateFitness, or "numpy" to evaluate them all at once with evaluateFitnessLockstep
+        self.cycleDetection = True #True if the fitness evaluation should stop once the individual repeats an earlier position, State, and hit counts, since it can only revisit cells from then on
+        self.fitnessCache = FitnessCache(100000) #Cache of fitnesses keyed by individual structure and Field, or None to always simulate
+        self.visitedCells = None #Buffer reused by evaluateFitness to mark visited cells, one byte per cell of the Field
+        self.visitedMarker = 0 #The value marking cells visited in the latest evaluation in visitedCells
         
         #threading variables
-        self.threadCount = 4 #4 is best with my  processor, will need to be configured for best performance on a given machine.
+        self.threadCount = 4 #The number of worker processes. applyCalibration replaces it with the fastest value calibrate measured on this host.
         self.popChunks = [] #List of subsets/chunks of the population to be evaluated in seperate threads
+        self.persistentWorkers = True #True if evaluation should reuse one long-lived pool of worker processes instead of spawning new processes for every sample
+        self.workUnitSize = 20 #The number of individuals in each task sent to the worker pool. Idle workers take the next task, so smaller tasks balance uneven run lengths better but cost more messages. 0 splits each Field into threadCount equal chunks.
+        self.workerRetries = 2 #The number of times a dispatch is sent again after a worker process dies before giving up
+        self.workerFailures = 0 #The number of times a worker process died during evaluation
+        self.workerBusyTime = {} #Seconds each worker process spent evaluating tasks, by process id
+        self.workerIdleTime = {} #Seconds each worker process spent waiting while the worker pool had tasks outstanding, by process id
+        self.workerPool = None #The pool of worker processes used when persistentWorkers is True. Created on first use.
+        self.batchedSamples = True #True if all evalSample Fields should be generated first and evaluated in a single dispatch to the workers, instead of one dispatch per Field
+        self.sharedFieldMemory = True #True if evaluation Fields should be kept in shared memory so worker processes attach to them instead of receiving copies
+        self.offspringInserted = 0 #The number of offspring that have replaced members of the population in steady-state mode
+        self.offspringTasks = {} #Steady-state offspring batches being evaluated by the worker pool, as tasks from createOffspringTask keyed to their futures
+        self.offspringSamples = None #The (Field, starting position, Field id) samples of the current steady-state round, or None before the first round
+        self.offspringSamplesUsed = 0 #The number of steady-state offspring bred for the current round's samples
+        self.checkpointPath = None #File that a checkpoint is written to in the background every checkpointInterval generations, or None to not write checkpoints
+        self.checkpointInterval = 10 #The number of generations between checkpoints
+        self.checkpointThread = None #The thread writing the latest checkpoint
+        self.remoteWorkers = None #A RemoteWorkerPool of worker daemons, possibly on other hosts, that evaluates individuals instead of this host's worker processes, or None to evaluate on this host
+        
+    calibrationFile = os.path.join(os.path.expanduser("~"), ".explorerevolution_calibration.json") #File holding the worker settings chosen by calibrate for each host, or None to neither load nor save them
+    calibrationAttributes = ("evalMovements", "evalSample", "successiveHalving", "halvingRounds", "halvingKeepFraction", "fieldWidth", "fieldHeight", "fieldObstacleMaxSides", "fieldCorpus", "simulator", "evaluationBlockedShortcut", "cycleDetection", "maxStartingSize", "batchedSamples", "sharedFieldMemory") #Attributes copied to the trial Evolutions run by calibrate
+    checkpointAttributes = ("popSize", "evalMovements", "maxStartingSize", "fieldWidth", "fieldHeight", "fieldBorderValue", "fieldObstacleFillerValue", "fieldObstacleMaxSides", "fixedFieldCount", "selectionPercentile", "probabilityHighParent", "mutationRate", "carryOver", "evalSample", "successiveHalving", "halvingRounds", "halvingKeepFraction", "evaluationBlockedShortcut", "canonicalizeOffspring", "simulator", "cycleDetection", "batchedSamples", "generation", "maxFitness", "fieldsGenerated", "evalsDone", "individualsSimulated", "stepsSimulated", "fitnessesReused", "offspringInserted", "checkpointInterval") #Settings and counters saved in checkpoints. Worker settings are left out, since they belong to the host.
+    checkpointMagic = b"EECP" #Identifies checkpoint files
+    checkpointVersion = 1 #The version of the checkpoint layout
+    fieldGeneratorAttributes = ("fieldWidth", "fieldHeight", "fieldBorderValue", "fieldObstacleFillerValue", "fieldObstacleMaxSides") #Attributes needed by generateField
+    evaluatorAttributes = ("evalMovements", "evaluationBlockedShortcut", "simulator", "cycleDetection", "field", "startingPosition") #Attributes needed by evaluateFitness, and the only ones sent to worker processes
         
     def initializePopulation(self):
         "Creates the initial random population"
@@ -230,8 +496,8 @@ class Evolution:
             self.population.append(self.generateRandomIndividual())
         self.popFitness = [0]*len(self.population)
         self.maxFitness = 0
-        for i in range(0, self.evalSample):
-            self.evaluatePopulation()
+        self.evaluateSamples()
+        self.checkpointIfDue()
             
     def generateRandomIndividual(self):
         "Generates a random state machine"
@@ -243,52 +509,478 @@ class Evolution:
         stateMachine.purgeIslands()
         return stateMachine
     
+    def evaluateSamples(self):
+        "Evaluates the population on evalSample Fields, adding the fitness of each individual on each Field to popFitness"
+        if self.successiveHalving:
+            self.evaluateSamplesByHalving()
+            return
+        if not self.batchedSamples:
+            for i in range(0, self.evalSample):
+                self.evaluatePopulation()
+                self.evalsDone = i + 1
+            return
+        samples = []
+        for i in range(0, self.evalSample):
+            self.generateField()
+            samples.append((self.field, self.startingPosition, self.fieldId))
+        for i, fitnesses in enumerate(self.evaluateOnFields(self.population, samples)):
+            self.recombineFitness(fitnesses)
+            self.evalsDone = i + 1
+
+    def evaluateSamplesByHalving(self):
+        "Evaluates the population with successive halving. In the first of halvingRounds rounds, every individual is evaluated on a fraction of the evalSample Fields with the same fraction of evalMovements. Each later round evaluates the top halvingKeepFraction of the previous round on more Fields with more movements, and the last round uses all evalSample Fields and evalMovements. An individual's popFitness is its total over the Fields of the last round it reached. The Fields of each round include those of earlier rounds and movements only grow, so promoted individuals never rank below those eliminated before them."
+        if self.halvingRounds < 1:
+            raise RuntimeError("Successive halving needs at least one round. halvingRounds: " + str(self.halvingRounds))
+        if not 0 < self.halvingKeepFraction <= 1:
+            raise RuntimeError("halvingKeepFraction must be in (0, 1]. halvingKeepFraction: " + str(self.halvingKeepFraction))
+        samples = []
+        for i in range(0, self.evalSample):
+            self.generateField()
+            samples.append((self.field, self.startingPosition, self.fieldId))
+        contenders = list(range(0, len(self.population))) #indices of the individuals in the current round
+        evalMovements = self.evalMovements
+        try:
+            for halvingRound in range(0, self.halvingRounds):
+                scale = self.halvingKeepFraction**(self.halvingRounds - 1 - halvingRound)
+                self.evalMovements = max(1, math.ceil(evalMovements*scale))
+                fitnesses = self.evaluateOnFields([self.population[i] for i in contenders], samples[:max(1, math.ceil(self.evalSample*scale))])
+                for j, i in enumerate(contenders):
+                    self.popFitness[i] = sum(sampleFitnesses[j] for sampleFitnesses in fitnesses)
+                if halvingRound < self.halvingRounds - 1:
+                    ranked = sorted(contenders, key=lambda i: self.popFitness[i], reverse=True)
+                    contenders = sorted(ranked[:max(1, math.ceil(len(contenders)*self.halvingKeepFraction))])
+        finally:
+            self.evalMovements = evalMovements
+        self.evalsDone = self.evalSample
+        for i in range(0, len(self.population)):
+            if self.popFitness[i] > self.maxFitness:
+                self.maxFitness = self.popFitness[i]
+                self.bestIndividual = self.population[i]
+
     def evaluatePopulation(self):
         "Evaluates the fitness of each individual in the population"
-        global fitnessQueue
         self.generateField()
-        self.threadCounter = 0
-        if self.threadCount > 1:
-            popChunkSize = math.ceil(self.popSize/(self.threadCount))
-            self.popChunks = list(Evolution.getChunks(self.population, popChunkSize))
-            actualThreadCount = len(self.popChunks) #if ((self.popSize % (self.threadCount-1)) != 0) else (self.threadCount-1) #If there is no remainder, no need for last chunk
+        self.recombineFitness(self.evaluateOnField(self.population))
 
-            processes = [multiprocessing.Process(target=self.evaluatePopChunk, args=(x, fitnessQueue, self.popChunks[x])) for x in range(actualThreadCount)]
+    def recombineFitness(self, fitnesses):
+        "Adds the fitness of each individual on one Field to popFitness and updates maxFitness and bestIndividual"
+        for i in range(0, self.popSize):
+            self.popFitness[i] += fitnesses[i]
+            if (self.popFitness[i] > self.maxFitness):
+                self.maxFitness = self.popFitness[i]
+                self.bestIndividual = self.population[i]
+                
+    def evaluateOnField(self, individuals):
+        "Returns a list of the fitness of each of the given individuals on the current Field. Individuals whose fitness is in the fitnessCache, or that have the same structure as another individual in the list, are not simulated again."
+        return self.evaluateOnFields(individuals, [(self.field, self.startingPosition, self.fieldId)])[0]
+
+    def evaluateOnFields(self, individuals, samples):
+        "Returns a list with the fitness of each of the given individuals on each of the given (Field, starting position, Field id) samples, simulating all samples in one dispatch. Individuals whose fitness is in the fitnessCache, or that have the same structure as another individual on the same Field, are not simulated again. With a fixed set of Fields, fitnesses are also stored on each individual and reused until it changes. Leaves the last sample as the current Field."
+        storeFitness = self.fixedFieldCount > 0 #Field ids repeat, so stored fitnesses can be used again. Not done for a fieldCorpus, whose Fields are too many to store.
+        if self.fitnessCache == None and not storeFitness:
+            return self.simulateOnFields([(field, startingPosition, individuals) for field, startingPosition, fieldId in samples])
+        lookup = self.lookupFitnesses(individuals, samples)
+        results = self.simulateOnFields([(field, startingPosition, list(u.values())) for (field, startingPosition, fieldId), u in zip(samples, lookup[1])])
+        return self.recordFitnesses(individuals, lookup, results)
+
+    def lookupFitnesses(self, individuals, samples):
+        "Finds the fitnesses of the given individuals on the given (Field, starting position, Field id) samples that need not be simulated, because they are in the fitnessCache, stored on the individual, or belong to an earlier individual with the same structure on the same Field. Returns a tuple of (fitnesses keyed to fitness keys, individuals to simulate on each sample keyed to their fitness keys, fitness keys of the individuals on each sample). Leaves the last sample as the current Field."
+        storeFitness = self.fixedFieldCount > 0
+        fitnesses = {} #fitness keyed to fitness key
+        uncached = [] #individuals to simulate on each sample keyed to their fitness keys
+        keyLists = [] #fitness keys of the individuals on each sample
+        pending = set() #fitness keys of all individuals to simulate
+        for field, startingPosition, fieldId in samples:
+            self.field, self.startingPosition, self.fieldId = field, startingPosition, fieldId
+            keys = [self.getFitnessKey(individual) for individual in individuals]
+            keyLists.append(keys)
+            uncached.append({})
+            for key, individual in zip(keys, individuals):
+                if key in fitnesses or key in pending: #same structure as an earlier individual on the same Field
+                    continue
+                fitness = individual.fieldFitness.get(key) if storeFitness else None
+                if fitness != None:
+                    self.fitnessesReused += 1
+                elif self.fitnessCache != None:
+                    fitness = self.fitnessCache.get(key)
+                if fitness == None:
+                    uncached[-1][key] = individual
+                    pending.add(key)
+                else:
+                    fitnesses[key] = fitness
+        return (fitnesses, uncached, keyLists)
+
+    def recordFitnesses(self, individuals, lookup, results):
+        "Adds the simulated fitness lists of each sample to the result of lookupFitnesses, puts them in the fitnessCache and, with a fixed set of Fields, stores them on the individuals. Returns a list with the fitness of each of the given individuals on each sample."
+        storeFitness = self.fixedFieldCount > 0
+        fitnesses, uncached, keyLists = lookup
+        for u, sampleFitnesses in zip(uncached, results):
+            for key, fitness in zip(list(u.keys()), sampleFitnesses):
+                fitnesses[key] = fitness
+                if self.fitnessCache != None:
+                    self.fitnessCache.put(key, fitness)
+        if storeFitness:
+            for keys in keyLists:
+                for key, individual in zip(keys, individuals):
+                    individual.fieldFitness[key] = fitnesses[key]
+        return [[fitnesses[key] for key in keys] for keys in keyLists]
+        
+    def getFitnessKey(self, individual):
+        "Returns a key identifying the fitness of the individual on the current Field with the current evaluation settings. Individuals with the same reachable structure get the same key regardless of their State identifiers."
+        compiled = individual.getCompiled()
+        stateCount = compiled.stateCount if self.evaluationBlockedShortcut else None #the blocked shortcut depends on the number of States, including unreachable ones
+        return (compiled.fingerprint, stateCount, self.fieldId, self.evalMovements, self.evaluationBlockedShortcut)
+        
+    def simulateOnFields(self, samples):
+        "Simulates the individuals of each (Field, starting position, individuals) sample on its Field and returns a list of their fitness lists. With a persistent worker pool, the individuals of every sample are split into chunks and all chunks go to the pool in a single dispatch. Leaves the last sample as the current Field."
+        if self.remoteWorkers != None or (self.threadCount > 1 and self.persistentWorkers):
+            self.individualsSimulated += sum(len(individuals) for field, startingPosition, individuals in samples)
+            if len(samples) > 0:
+                self.field, self.startingPosition = samples[-1][0], samples[-1][1]
+            if self.remoteWorkers != None:
+                return self.evaluateSamplesRemotely(samples)
+            return self.evaluateSamplesInPool(samples)
+        results = []
+        for field, startingPosition, individuals in samples:
+            self.field, self.startingPosition = field, startingPosition
+            results.append(self.simulateOnField(individuals))
+        return results
+        
+    def simulateOnField(self, individuals):
+        "Simulates each of the given individuals on the current Field and returns a list of their fitnesses, spreading the work over threadCount processes"
+        if self.remoteWorkers != None or (self.threadCount > 1 and self.persistentWorkers):
+            return self.simulateOnFields([(self.field, self.startingPosition, individuals)])[0]
+        self.individualsSimulated += len(individuals)
+        if self.threadCount > 1 and len(individuals) > 0:
+            popChunkSize = math.ceil(len(individuals)/(self.threadCount))
+            self.popChunks = list(Evolution.getChunks(individuals, popChunkSize))
+            actualThreadCount = len(self.popChunks)
+            fitnessQueue = getFitnessQueue()
+            evaluator = self.getEvaluator()
+            processes = [multiprocessing.Process(target=evaluateQueuedTask, args=((x, evaluator, self.popChunks[x]), fitnessQueue)) for x in range(actualThreadCount)]
             # Run processes
             for p in processes:
                 p.start()
+            # Get process results from the output queue as they arrive. Joining first could deadlock once a result fills the pipe.
+            results = {} #fitness list keyed to chunk number
+            failures = 0
+            while len(results) < actualThreadCount:
+                try:
+                    x, fitnessList, worker, busyTime, steps = fitnessQueue.get(timeout=0.1)
+                    if x not in results: #a restarted chunk may have been sent twice
+                        self.stepsSimulated += steps
+                    results[x] = fitnessList
+                except queue.Empty:
+                    for x in range(actualThreadCount):
+                        if x not in results and processes[x].exitcode not in (None, 0): #the process died before sending its result
+                            if failures >= self.workerRetries:
+                                raise RuntimeError("Worker process for chunk " + str(x) + " exited with code " + str(processes[x].exitcode))
+                            failures += 1
+                            self.workerFailures += 1
+                            processes[x] = multiprocessing.Process(target=evaluateQueuedTask, args=((x, evaluator, self.popChunks[x]), fitnessQueue))
+                            processes[x].start()
             # Exit the completed processes
             for p in processes:
                 p.join()
-            # Get process results from the output queue
-            results = [fitnessQueue.get() for p in processes]
-            results.sort()
-            results = [r[1] for r in results]
-
-            for i in range(0, self.popSize): #recombine fitness
-                self.popFitness[i] += results[int(i / popChunkSize)][i % popChunkSize]
-                if (self.popFitness[i] > self.maxFitness):
-                    self.maxFitness = self.popFitness[i]
-                    self.bestIndividual = self.population[i]
+            return [fitness for x in range(actualThreadCount) for fitness in results[x]]
+        return self.evaluateIndividuals(individuals)
+        
+    def evaluateSamplesInPool(self, samples):
+        "Evaluates the individuals of each (Field, starting position, individuals) sample using the persistent worker pool, splitting each sample into tasks of workUnitSize individuals, and returns a list of fitness lists, one per sample. Results are collected as they arrive, and if a worker process dies the pool is restarted and the unfinished tasks are sent again, up to workerRetries times."
+        tasks = []
+        for s, (field, startingPosition, individuals) in enumerate(samples):
+            if len(individuals) == 0:
+                continue
+            evaluator = self.getEvaluator()
+            evaluator.field, evaluator.startingPosition = field, startingPosition
+            chunkSize = self.workUnitSize if self.workUnitSize > 0 else math.ceil(len(individuals)/self.threadCount)
+            for chunk in Evolution.getChunks(individuals, chunkSize):
+                tasks.append((s, evaluator, chunk))
+        taskResults = [None]*len(tasks) #fitness list of each task
+        pending = set(range(0, len(tasks))) #indices of tasks without a result
+        busyTimes = {} #seconds spent on this dispatch's tasks, by worker process id
+        failures = 0
+        start = time.perf_counter()
+        while len(pending) > 0:
+            try:
+                pool = self.getWorkerPool()
+                futures = {pool.submit(evaluateWorkerTask, tasks[t]): t for t in sorted(pending)}
+                for future in concurrent.futures.as_completed(futures):
+                    s, fitnesses, worker, busyTime, steps = future.result()
+                    taskResults[futures[future]] = fitnesses
+                    self.stepsSimulated += steps
+                    pending.discard(futures[future])
+                    busyTimes[worker] = busyTimes.get(worker, 0) + busyTime
+            except concurrent.futures.BrokenExecutor: #a worker process died
+                if failures >= self.workerRetries:
+                    raise
+                failures += 1
+                self.workerFailures += 1
+                self.startWorkerPool()
+        self.recordWorkerTimes(busyTimes, time.perf_counter() - start)
+        results = [[] for sample in samples]
+        for (s, evaluator, chunk), fitnesses in zip(tasks, taskResults): #tasks are in sample and individual order
+            results[s].extend(fitnesses)
+        return results
+
+    def evaluateSamplesRemotely(self, samples):
+        "Evaluates the individuals of each (Field, starting position, individuals) sample on the worker daemons of remoteWorkers, splitting each sample into tasks of workUnitSize individuals, and returns a list of fitness lists, one per sample"
+        tasks = []
+        for s, (field, startingPosition, individuals) in enumerate(samples):
+            if len(individuals) == 0:
+                continue
+            evaluator = self.getEvaluator()
+            evaluator.field, evaluator.startingPosition = field, startingPosition
+            chunkSize = self.workUnitSize if self.workUnitSize > 0 else math.ceil(len(individuals)/max(len(self.remoteWorkers.addresses), 1))
+            for chunk in Evolution.getChunks(individuals, chunkSize):
+                tasks.append((s, evaluator, chunk))
+        taskResults = self.remoteWorkers.evaluate([(evaluator, chunk) for s, evaluator, chunk in tasks])
+        results = [[] for sample in samples]
+        for (s, evaluator, chunk), (fitnesses, steps) in zip(tasks, taskResults):
+            results[s].extend(fitnesses)
+            self.stepsSimulated += steps
+        return results
+
+    def recordWorkerTimes(self, busyTimes, elapsed):
+        "Adds the busy time of each worker in one dispatch to workerBusyTime, and the rest of the dispatch's elapsed time to workerIdleTime. Workers that took no task in the dispatch count as idle for all of it."
+        for worker in busyTimes:
+            self.workerIdleTime.setdefault(worker, 0)
+        for worker in self.workerIdleTime:
+            busyTime = busyTimes.get(worker, 0)
+            self.workerBusyTime[worker] = self.workerBusyTime.get(worker, 0) + busyTime
+            self.workerIdleTime[worker] += max(elapsed - busyTime, 0)
+
+    def getWorkerUtilization(self):
+        "Returns the fraction of time the worker processes spent evaluating while the worker pool had tasks outstanding, or None if no tasks have been sent"
+        totalTime = sum(self.workerBusyTime.values()) + sum(self.workerIdleTime.values())
+        if totalTime == 0:
+            return None
+        return sum(self.workerBusyTime.values()) / totalTime
+        
+    def getWorkerPool(self):
+        "Returns the persistent worker pool, starting it if it isn't running"
+        if self.workerPool == None:
+            self.startWorkerPool()
+        return self.workerPool
+        
+    def startWorkerPool(self):
+        "Starts a pool of threadCount worker processes that is reused across samples and generations"
+        self.shutdownWorkerPool()
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running() #Workers must share the parent's tracker, otherwise each one would free SharedFields it attached to when it exits
+        self.workerPool = concurrent.futures.ProcessPoolExecutor(max_workers=self.threadCount)
+        
+    def shutdownWorkerPool(self):
+        "Stops the worker pool, if running, and waits for its processes to exit. Connections to remote worker daemons are closed too, and reopened on next use."
+        self.offspringTasks = {} #their results are no longer wanted
+        if self.remoteWorkers != None:
+            self.remoteWorkers.close()
+        if self.workerPool != None:
+            self.workerPool.shutdown(wait=True)
+            self.workerPool = None
+
+    def calibrate(self, threadCounts = None, workUnitSizes = (0, 20, 5), samples = 1, save = True):
+        "Times evaluating a random population of popSize individuals with the current evaluation settings for each combination of the given worker counts and task sizes, and sets threadCount and workUnitSize to the fastest. The worker counts default to powers of two up to the number of CPUs. Saves the choice for this host in calibrationFile if save is True. Returns the (threadCount, workUnitSize) chosen."
+        if threadCounts == None:
+            cpuCount = os.cpu_count() or 1
+            threadCounts = sorted(set([2**i for i in range(0, cpuCount.bit_length()) if 2**i < cpuCount] + [cpuCount]))
+        randomState = random.getstate()
+        times = {} #seconds per sample keyed to (threadCount, workUnitSize)
+        for threadCount in threadCounts:
+            for workUnitSize in (workUnitSizes if threadCount > 1 else (0,)): #tasks are only used with workers
+                times[(threadCount, workUnitSize)] = self.timeCalibrationTrial(threadCount, workUnitSize, samples)
+        random.setstate(randomState)
+        self.shutdownWorkerPool() #the pool may have the wrong number of workers
+        self.threadCount, self.workUnitSize = min(times, key=times.get)
+        if save:
+            Evolution.saveCalibration(self.threadCount, self.workUnitSize)
+        return (self.threadCount, self.workUnitSize)
+
+    def timeCalibrationTrial(self, threadCount, workUnitSize, samples):
+        "Returns the seconds taken to evaluate a random population on evalSample Fields, averaged over the given number of samples, with the given worker settings. Every trial uses the same population and Fields."
+        trial = Evolution(0)
+        for attribute in Evolution.calibrationAttributes:
+            setattr(trial, attribute, getattr(self, attribute))
+        trial.popSize = self.popSize
+        trial.threadCount = threadCount
+        trial.workUnitSize = workUnitSize
+        trial.fitnessCache = None #every trial should simulate the whole population
+        try:
+            random.seed(0)
+            trial.population = [trial.generateRandomIndividual() for i in range(0, trial.popSize)]
+            trial.popFitness = [0]*trial.popSize
+            trial.evaluateSamples() #warm up, starting the worker pool
+            start = time.perf_counter()
+            for i in range(0, samples):
+                trial.evaluateSamples()
+            return (time.perf_counter() - start) / samples
+        finally:
+            trial.shutdownWorkerPool()
+
+    def getHostKey():
+        "Returns the key identifying this host in the calibration file"
+        return socket.gethostname() + ":" + str(os.cpu_count())
+
+    def applyCalibration(self):
+        "Sets threadCount and workUnitSize to the values calibrate saved for this host, if it has been run here. Returns True if a calibration was applied."
+        calibration = Evolution.loadCalibration()
+        if calibration == None:
+            return False
+        self.threadCount, self.workUnitSize = calibration
+        return True
+
+    def loadCalibration():
+        "Returns the (threadCount, workUnitSize) saved by calibrate for this host, or None if this host hasn't been calibrated"
+        if Evolution.calibrationFile == None:
+            return None
+        try:
+            with open(Evolution.calibrationFile, "r") as file:
+                calibration = json.load(file).get(Evolution.getHostKey())
+            return (int(calibration["threadCount"]), int(calibration["workUnitSize"]))
+        except (OSError, ValueError, AttributeError, TypeError, KeyError): #missing or unreadable file, or no entry for this host
+            return None
+
+    def saveCalibration(threadCount, workUnitSize):
+        "Saves the given worker settings for this host in the calibration file, keeping the entries of other hosts"
+        if Evolution.calibrationFile == None:
+            return
+        calibrations = {}
+        try:
+            with open(Evolution.calibrationFile, "r") as file:
+                calibrations = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(calibrations, dict):
+            calibrations = {}
+        calibrations[Evolution.getHostKey()] = {"threadCount": threadCount, "workUnitSize": workUnitSize}
+        temporaryPath = Evolution.calibrationFile + ".tmp"
+        with open(temporaryPath, "w") as file:
+            json.dump(calibrations, file, indent=1)
+        os.replace(temporaryPath, Evolution.calibrationFile)
+            
+    def getEvaluator(self):
+        "Returns a lightweight Evolution holding only the attributes evaluateFitness needs, so it is cheap to send to worker processes"
+        evaluator = Evolution.__new__(Evolution)
+        for attribute in Evolution.evaluatorAttributes:
+            setattr(evaluator, attribute, getattr(self, attribute))
+        evaluator.visitedCells = None
+        evaluator.visitedMarker = 0
+        evaluator.stepsSimulated = 0
+        return evaluator
+        
+    def getFieldGenerator(self):
+        "Returns a lightweight Evolution holding only the attributes generateField needs to generate a new Field in a single process"
+        generator = Evolution.__new__(Evolution)
+        for attribute in Evolution.fieldGeneratorAttributes:
+            setattr(generator, attribute, getattr(self, attribute))
+        generator.threadCount = 1
+        generator.sharedFieldMemory = False
+        generator.fieldCorpus = None
+        generator.fixedFieldCount = 0
+        generator.fieldsGenerated = 0
+        return generator
+
+    def createFieldCorpus(self, path, count, seed = None):
+        "Generates count Fields with the current field settings using threadCount processes, saves them as a FieldCorpus file at the given path, and returns the opened FieldCorpus"
+        return FieldCorpus.create(path, self.getFieldGenerator(), count, self.threadCount, seed)
+        
+    def __getstate__(self):
+        "Excludes the worker pool when pickling, since it cannot be sent to other processes"
+        state = self.__dict__.copy()
+        state["workerPool"] = None
+        state["checkpointThread"] = None
+        state["offspringTasks"] = {}
+        state["remoteWorkers"] = None
+        return state
+
+    def toCheckpoint(self):
+        "Returns a checkpoint of this Evolution as bytes: the settings, counters, popFitness and random number generator state as a JSON header, followed by each distinct individual in its binary form. Individuals that appear more than once in the population are stored once."
+        machines = [] #distinct individuals
+        indices = {} #index in machines keyed to the id of each individual
+        for individual in self.population + ([self.bestIndividual] if self.bestIndividual != None else []):
+            if id(individual) not in indices:
+                indices[id(individual)] = len(machines)
+                machines.append(individual)
+        header = {attribute: getattr(self, attribute) for attribute in Evolution.checkpointAttributes}
+        header["population"] = [indices[id(individual)] for individual in self.population]
+        header["bestIndividual"] = indices[id(self.bestIndividual)] if self.bestIndividual != None else None
+        header["popFitness"] = self.popFitness
+        header["randomState"] = random.getstate()
+        header["fieldCorpus"] = self.fieldCorpus.path if self.fieldCorpus != None else None
+        headerBytes = json.dumps(header).encode("utf-8")
+        data = bytearray(struct.pack("<4sII", Evolution.checkpointMagic, Evolution.checkpointVersion, len(headerBytes)))
+        data += headerBytes
+        data += struct.pack("<I", len(machines))
+        for machine in machines:
+            machineBytes = machine.toBytes()
+            data += struct.pack("<I", len(machineBytes))
+            data += machineBytes
+        return bytes(data)
+
+    def fromCheckpoint(data):
+        "Returns a new Evolution restored from a checkpoint created by toCheckpoint, and restores the random number generator state saved with it"
+        magic, version, headerLength = struct.unpack_from("<4sII", data)
+        if magic != Evolution.checkpointMagic or version != Evolution.checkpointVersion:
+            raise RuntimeError("Not a version " + str(Evolution.checkpointVersion) + " ExplorerEvolution checkpoint")
+        offset = struct.calcsize("<4sII")
+        header = json.loads(bytes(data[offset:offset + headerLength]).decode("utf-8"))
+        offset += headerLength
+        machineCount, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        machines = []
+        for i in range(0, machineCount):
+            length, = struct.unpack_from("<I", data, offset)
+            offset += 4
+            machines.append(StateMachine.fromBytes(data[offset:offset + length]))
+            offset += length
+        evolution = Evolution(header["popSize"])
+        for attribute in Evolution.checkpointAttributes:
+            if attribute in header: #checkpoints written before a setting was added keep its default
+                setattr(evolution, attribute, header[attribute])
+        evolution.population = [machines[i] for i in header["population"]]
+        evolution.bestIndividual = machines[header["bestIndividual"]] if header["bestIndividual"] != None else None
+        evolution.popFitness = header["popFitness"]
+        if header["fieldCorpus"] != None:
+            evolution.fieldCorpus = FieldCorpus.load(header["fieldCorpus"])
+        version, internalState, gauss = header["randomState"]
+        random.setstate((version, tuple(internalState), gauss))
+        return evolution
+
+    def saveCheckpoint(self, path, background = False):
+        "Writes a checkpoint of this Evolution to the given path, replacing the file in one step so a crash never leaves a partial checkpoint. The checkpoint is taken immediately, but with background set it is written by a separate thread so evaluation can continue."
+        data = self.toCheckpoint()
+        self.waitForCheckpoint()
+        if background:
+            self.checkpointThread = threading.Thread(target=Evolution.writeFileAtomically, args=(path, data))
+            self.checkpointThread.start()
         else:
-            self.evaluatePopSingleThread()
-        
-    def evaluatePopSingleThread(self):
-        "Evaluates entire population"
-        for index, individual in enumerate(self.population):
-            fitness = self.evaluateFitness(individual)
-            self.popFitness[index] += fitness
-            if (self.popFitness[index] > self.maxFitness):
-                self.maxFitness = self.popFitness[index]
-                self.bestIndividual = individual
-                
-    def evaluatePopChunk(self, i, fitnessQueue, population):
-        "Evaluates the given chunk of the population. Parameters: i: thread number, fitnessQueue: a queue that all fitnesses will be added to, population: the individuals to evaluate"
-        fitnessList = []
-        for index, individual in enumerate(population):
-            fitness = self.evaluateFitness(individual)
-            fitnessList.append(fitness)
-        fitnessQueue.put((i, fitnessList))
+            Evolution.writeFileAtomically(path, data)
+
+    def waitForCheckpoint(self):
+        "Waits for the checkpoint being written in the background, if any, to finish"
+        if self.checkpointThread != None:
+            self.checkpointThread.join()
+            self.checkpointThread = None
+
+    def checkpointIfDue(self):
+        "Writes a checkpoint in the background if checkpointPath is set and the generation is a multiple of checkpointInterval"
+        if self.checkpointPath != None and self.generation % self.checkpointInterval == 0:
+            self.saveCheckpoint(self.checkpointPath, background=True)
+
+    def loadCheckpoint(path):
+        "Returns a new Evolution restored from the checkpoint file at the given path"
+        with open(path, "rb") as file:
+            return Evolution.fromCheckpoint(file.read())
+
+    def writeFileAtomically(path, data):
+        "Writes the data to a temporary file next to the given path, then renames it over the path"
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporaryPath, path)
         
     def getChunks(l, n): 
         "Yields n members of list l. Fist time called will return the first n members, the next time will return the next n members, etc."
@@ -297,74 +989,221 @@ class Evolution:
         
     def evaluateFitness(self, individual):
         "Evaluates the fitness of an individual based on the number of unique coordinates it travels to"
-        coordinatesTravelled = []
-        position = Coordinate(int(self.startingPosition.x), int(self.startingPosition.y))
-        individual.currentState = 0
-        individual.resetStates()
-        direction = individual.getCurrentValue()
-        statesNum = len(individual.statesDict)
+        x = int(self.startingPosition.x)
+        y = int(self.startingPosition.y)
+        field = self.field
+        width = field.width
+        height = field.height
+        grid = field.grid
+        visitedCells, visitedMarker = self.getVisitedCells()
+        uniqueCells = 0
+        xMoves = State.xMoves
+        yMoves = State.yMoves
+        machine = individual.getCompiled()
+        machine.resetHitCounts()
+        nextStates = machine.nextStates
+        blockedStates = machine.blockedStates
+        breakStates = machine.breakStates
+        breakAfters = machine.breakAfters
+        values = machine.values
+        hitCounts = machine.hitCounts
+        state = 0
+        direction = values[state]
+        statesNum = machine.stateCount
         consecutiveBlocks = 0
+        cycleDetection = self.cycleDetection
+        #Checkpoint for cycle detection. Moved to the current step whenever the steps since it reach a power of 2, as in Brent's algorithm.
+        checkpointX = x
+        checkpointY = y
+        checkpointState = state
+        checkpointHits = hitCounts[:]
+        nextCheckpoint = 1
+        steps = self.evalMovements
         for i in range(0, self.evalMovements):
-            startX = int(position.x)
-            startY = int(position.y)
-            if direction == 1: #up
-                position.y += 1
-            elif direction == 2: #up-right
-                position.y += 1
-                position.x += 1
-            elif direction == 3: #right
-                position.x += 1
-            elif direction == 4: #down-right
-                position.y += -1
-                position.x += 1
-            elif direction == 5: #down
-                position.y += -1
-            elif direction == 6: #down-left
-                position.y += -1
-                position.x += -1
-            elif direction == 7: #left
-                position.x += -1
-            elif direction == 8: #up-left
-                position.y += 1
-                position.x += -1
-            blocked = self.field.getValueAtCoordinate(position) != 0
-            if blocked == True:
+            newX = x + xMoves[direction]
+            newY = y + yMoves[direction]
+            if (newX < width) and (newY < height) and (newX >= 0) and (newY >= 0) and grid[newX][newY] == 0:
+                consecutiveBlocks = 0
+                x = newX
+                y = newY
+                cell = x*height + y
+                if visitedCells[cell] != visitedMarker: #first visit to this cell in this evaluation
+                    visitedCells[cell] = visitedMarker
+                    uniqueCells += 1
+                targets = nextStates
+            else:
                 consecutiveBlocks += 1
                 if (self.evaluationBlockedShortcut and consecutiveBlocks > statesNum):
+                    steps = i + 1
                     break #This is a shortcut for performance, but it may not actually be stuck since the hit count may transition to an unblocked break state eventually
-                position = Coordinate(startX, startY)
-                direction = individual.getBlockedValue()
+                targets = blockedStates
+            #Same transition as StateMachine.nextState and blockedState. Hit counts are only kept for States with a breakAfter point, since they don't matter otherwise and would keep growing, so the run could never repeat exactly.
+            breakAfter = breakAfters[state]
+            if breakAfter > -1:
+                hits = hitCounts[state] + 1
+                if breakAfter <= hits:
+                    hitCounts[state] = 0
+                    state = breakStates[state]
+                else:
+                    hitCounts[state] = hits
+                    state = targets[state]
             else:
-                consecutiveBlocks = 0
-                coordinatesTravelled.append(position)
-                direction = individual.getNextValue()
-        return len(Counter(coordinatesTravelled).keys())
+                state = targets[state]
+            direction = values[state]
+            if cycleDetection:
+                if x == checkpointX and y == checkpointY and state == checkpointState and hitCounts == checkpointHits:
+                    steps = i + 1
+                    break #The run is deterministic, so from here on it repeats the steps since the checkpoint and visits no new cells
+                if i + 1 == nextCheckpoint:
+                    checkpointX = x
+                    checkpointY = y
+                    checkpointState = state
+                    checkpointHits = hitCounts[:]
+                    nextCheckpoint *= 2
+        self.stepsSimulated += steps
+        return uniqueCells
+        
+    def evaluateIndividuals(self, individuals):
+        "Returns a list of the fitness of each of the given individuals on the current Field, using the configured simulator"
+        if self.simulator == "numpy":
+            return self.evaluateFitnessLockstep(individuals)
+        return [self.evaluateFitness(individual) for individual in individuals]
+        
+    def evaluateFitnessLockstep(self, individuals):
+        "Evaluates the fitness of all the given individuals at once with NumPy, advancing every individual by one movement per iteration. Returns a list with the same fitnesses as evaluateFitness."
+        if numpy == None:
+            raise RuntimeError("The numpy simulator requires NumPy to be installed")
+        count = len(individuals)
+        if count == 0:
+            return []
+        machines = [individual.getCompiled() for individual in individuals]
+        #Positions are indices into the Field padded with one blocked cell on each side, so moving out of the Field needs no bounds check
+        paddedHeight = self.field.height + 2
+        paddedSize = (self.field.width + 2)*paddedHeight
+        openCells = numpy.zeros((self.field.width + 2, paddedHeight), numpy.bool_)
+        openCells[1:-1, 1:-1] = self.field.toArray() == 0
+        openCells = openCells.reshape(-1)
+        moves = numpy.array(State.xMoves, numpy.int64)*paddedHeight + numpy.array(State.yMoves, numpy.int64) #Change in position for each value
+        #Pack every machine's tables into arrays padded to the same number of States. State s of individual p is at index p*maxStates + s.
+        maxStates = max(len(machine.values) for machine in machines)
+        transitions = numpy.zeros((2, count*maxStates), numpy.int64) #Next State when not blocked (row 0) and when blocked (row 1)
+        breakStates = numpy.zeros(count*maxStates, numpy.int64)
+        breakAfters = numpy.full(count*maxStates, -1, numpy.int64)
+        values = numpy.zeros(count*maxStates, numpy.int64)
+        for p, machine in enumerate(machines):
+            start = p*maxStates
+            end = start + len(machine.values)
+            transitions[0, start:end] = machine.nextStates
+            transitions[1, start:end] = machine.blockedStates
+            breakStates[start:end] = machine.breakStates
+            breakAfters[start:end] = machine.breakAfters
+            values[start:end] = machine.values
+        stateMoves = moves[values]
+        statesNum = numpy.array([machine.stateCount for machine in machines], numpy.int64)
+        rowStarts = numpy.arange(count, dtype=numpy.int64)*maxStates
+        #Simulator state of each individual
+        position = numpy.full(count, (int(self.startingPosition.x) + 1)*paddedHeight + int(self.startingPosition.y) + 1, numpy.int64)
+        state = rowStarts.copy() #index of the current State
+        hitCounts = numpy.zeros(count*maxStates, numpy.int64)
+        consecutiveBlocks = numpy.zeros(count, numpy.int64)
+        visitedCells = numpy.zeros(count*paddedSize, numpy.bool_)
+        uniqueCells = numpy.zeros(count, numpy.int64)
+        live = numpy.arange(count) #Individuals still being evaluated
+        for i in range(0, self.evalMovements):
+            if live.size == 0:
+                break
+            self.stepsSimulated += live.size
+            liveState = state[live]
+            newPosition = position[live] + stateMoves[liveState]
+            opened = openCells[newPosition]
+            blocked = ~opened
+            liveBlocks = numpy.where(opened, 0, consecutiveBlocks[live] + 1)
+            consecutiveBlocks[live] = liveBlocks
+            #move and count newly visited cells
+            moved = live[opened]
+            position[moved] = newPosition[opened]
+            visitedIndex = moved*paddedSize + newPosition[opened]
+            uniqueCells[moved] += ~visitedCells[visitedIndex]
+            visitedCells[visitedIndex] = True
+            if self.evaluationBlockedShortcut:
+                continuing = opened | (liveBlocks <= statesNum[live])
+                live = live[continuing]
+                liveState = liveState[continuing]
+                blocked = blocked[continuing]
+            #transition, as in evaluateFitness
+            breakAfter = breakAfters[liveState]
+            counted = breakAfter > -1
+            hits = hitCounts[liveState] + counted
+            broken = counted & (breakAfter <= hits)
+            hitCounts[liveState] = numpy.where(broken, 0, hits)
+            state[live] = rowStarts[live] + numpy.where(broken, breakStates[liveState], transitions[blocked.view(numpy.int8), liveState])
+        return uniqueCells.tolist()
+        
+    def getVisitedCells(self):
+        "Returns the reusable buffer marking the cells of the current Field visited during an evaluation, and the marker value for the evaluation about to start. Cells visited in earlier evaluations hold older markers, so the buffer only has to be cleared when the marker wraps around."
+        size = self.field.width * self.field.height
+        if self.visitedCells == None or len(self.visitedCells) != size:
+            self.visitedCells = bytearray(size)
+            self.visitedMarker = 0
+        elif self.visitedMarker == 255:
+            self.visitedCells[:] = bytes(size)
+            self.visitedMarker = 0
+        self.visitedMarker += 1
+        return self.visitedCells, self.visitedMarker
 
     def generateField(self):
-        "Randomly generates the field that individuals will be evaluated against"
+        "Randomly generates the field that individuals will be evaluated against, or picks a random Field from fieldCorpus if set. If fixedFieldCount is above 0, only the first fixedFieldCount Fields are generated or picked, and later calls cycle through them."
+        if self.fixedFieldCount > 0:
+            if len(self.fixedFields) < self.fixedFieldCount:
+                self.generateNewField()
+                self.fixedFields.append((self.field, self.startingPosition, self.fieldId))
+            else:
+                self.field, self.startingPosition, self.fieldId = self.fixedFields[self.fixedFieldIndex % self.fixedFieldCount]
+            self.fixedFieldIndex += 1
+            return
+        self.generateNewField()
+
+    def generateNewField(self):
+        "Randomly generates a new Field for individuals to be evaluated against, or picks a random Field from fieldCorpus if set"
+        if self.fieldCorpus != None:
+            index = random.randrange(len(self.fieldCorpus))
+            self.field = self.fieldCorpus.getField(index)
+            self.startingPosition = self.fieldCorpus.getStartingPosition(index)
+            self.fieldId = (self.fieldCorpus.corpusId, index)
+            return
         #minCircleSize = 0
         #maxCircleSize = 1
         #obstacles = 1
-        self.field = Field(self.fieldWidth, self.fieldHeight, 0)
+        self.field = self.createField()
+        self.fieldsGenerated += 1
+        self.fieldId = self.fieldsGenerated
         minCircleSize = 10
         maxCircleSize = 80
         obstacles = random.randint(1, 10)
         for s in range(0, obstacles):
-            sides = random.randint(1, 2) #change upper bound for other shapes
+            sides = random.randint(1, self.fieldObstacleMaxSides)
             if (sides < 3):
                 self.field.generateCircle(random.randint(minCircleSize, maxCircleSize), Coordinate(random.randint(0, self.fieldWidth-1), random.randint(0, self.fieldHeight-1)), self.fieldBorderValue, self.fieldObstacleFillerValue)
-            #else:
-                #self.field.generateRandomShape(sides, random.randint(minCircleSize, maxCircleSize), Coordinate(random.randint(0, self.fieldWidth-1), random.randint(0, self.fieldHeight-1)), self.fieldBorderValue, self.fieldObstacleFillerValue)
+            else:
+                self.field.generateRandomShape(sides, random.randint(minCircleSize, maxCircleSize), Coordinate(random.randint(0, self.fieldWidth-1), random.randint(0, self.fieldHeight-1)), self.fieldBorderValue, self.fieldObstacleFillerValue)
         self.field.drawFieldBorder(self.fieldBorderValue)
         self.startingPosition = self.field.getOpenCoordinate()
 		
+    def createField(self):
+        "Creates an empty evaluation Field. The Field is placed in shared memory when it will be evaluated by worker processes and sharedFieldMemory is True. Otherwise it is a NumpyField if NumPy is installed, so obstacles are drawn faster."
+        if self.sharedFieldMemory and self.threadCount > 1:
+            return SharedField(self.fieldWidth, self.fieldHeight, 0)
+        if numpy != None:
+            return NumpyField(self.fieldWidth, self.fieldHeight, 0)
+        return Field(self.fieldWidth, self.fieldHeight, 0)
+			
     def nextGeneration(self):
         "Evaluates current generation and creates next generation of individuals"
         self.evalsDone = 0
         self.initializeOverselection()
         newPopulation = []
         for i in range(1, int(self.popSize*self.carryOver)):
-            newPopulation.append(self.mutate(self.crossover(self.selectParent(), self.selectParent())))
+            newPopulation.append(self.createChild())
         newPopulation.append(self.bestIndividual) #carry over best individual
         for i in range(0, self.popSize - len(newPopulation)): #Get the remaining individuals by cloning
             newPopulation.append(self.selectParent())
@@ -374,9 +1213,130 @@ class Evolution:
         self.popFitness.clear()
         self.popFitness = [0]*len(self.population)
         self.maxFitness = 0
-        for i in range(0, self.evalSample):
-            self.evaluatePopulation()
-            self.evalsDone = i + 1
+        self.evaluateSamples()
+        self.checkpointIfDue()
+
+    def createChild(self):
+        "Creates a new individual by crossing over two parents chosen by selectParent and mutating the result"
+        child = self.mutate(self.crossover(self.selectParent(), self.selectParent()))
+        if self.canonicalizeOffspring:
+            child.canonicalize()
+        return child
+
+    def runSteadyState(self, offspringCount):
+        "Evolves the population without generation barriers until at least offspringCount offspring have been evaluated. Offspring are bred in batches of workUnitSize and evaluated on the evalSample Fields of the current round from getOffspringSamples, through the same fitnessCache, stored fitnesses and remote workers as nextGeneration. As soon as a batch is evaluated, its offspring replace members below the overselection boundary and new batches are bred from the updated population. With a persistent worker pool, up to two batches per worker stay queued, including between calls, so workers never wait for breeding. generation counts every popSize offspring inserted."
+        if len(self.population) == 0:
+            self.initializePopulation()
+        self.initializeOverselection()
+        batchSize = self.workUnitSize if self.workUnitSize > 0 else max(1, self.popSize // (4*max(self.threadCount, 1)))
+        inserted = 0
+        failures = 0
+        while inserted < offspringCount:
+            if self.remoteWorkers != None or self.threadCount <= 1 or not self.persistentWorkers:
+                offspring = [self.createChild() for i in range(0, min(batchSize, offspringCount - inserted))]
+                fitnesses = self.evaluateOnFields(offspring, self.getOffspringSamples(len(offspring)))
+                inserted += self.insertOffspring(offspring, [sum(sampleFitnesses[i] for sampleFitnesses in fitnesses) for i in range(0, len(offspring))])
+                continue
+            try:
+                self.fillOffspringQueue(batchSize)
+                done, notDone = concurrent.futures.wait(list(self.offspringTasks.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    inserted += self.finishOffspringTask(self.offspringTasks.pop(future), future.result())
+                if inserted >= offspringCount:
+                    self.fillOffspringQueue(batchSize) #so the workers stay busy until the next call
+            except concurrent.futures.BrokenExecutor: #a worker process died, so send every queued batch again
+                if failures >= self.workerRetries:
+                    raise
+                failures += 1
+                self.workerFailures += 1
+                tasks = list(self.offspringTasks.values())
+                self.startWorkerPool()
+                for task in tasks:
+                    self.offspringTasks[self.workerPool.submit(evaluateWorkerTasks, task[2])] = task
+
+    def getOffspringSamples(self, count):
+        "Returns the (Field, starting position, Field id) samples to evaluate the next count steady-state offspring on. A new round of evalSample Fields is generated for every popSize offspring, so steady state generates as many Fields per offspring as nextGeneration."
+        if self.offspringSamples == None or self.offspringSamplesUsed >= self.popSize:
+            self.offspringSamples = []
+            for i in range(0, self.evalSample):
+                self.generateField()
+                self.offspringSamples.append((self.field, self.startingPosition, self.fieldId))
+            self.offspringSamplesUsed = 0
+        self.offspringSamplesUsed += count
+        return self.offspringSamples
+
+    def fillOffspringQueue(self, batchSize):
+        "Breeds offspring batches and sends them to the worker pool until two batches per worker are queued"
+        pool = self.getWorkerPool()
+        while len(self.offspringTasks) < 2*self.threadCount:
+            task = self.createOffspringTask(batchSize)
+            self.offspringTasks[pool.submit(evaluateWorkerTasks, task[2])] = task
+
+    def createOffspringTask(self, count):
+        "Breeds count offspring from the current population and looks up the fitnesses they need not simulate on the current round's Fields. Returns a tuple of (offspring, result of lookupFitnesses, evaluateWorkerTask tasks simulating the rest)."
+        offspring = [self.createChild() for i in range(0, count)]
+        samples = self.getOffspringSamples(count)
+        lookup = self.lookupFitnesses(offspring, samples)
+        tasks = []
+        for s, ((field, startingPosition, fieldId), u) in enumerate(zip(samples, lookup[1])):
+            if len(u) == 0:
+                continue
+            evaluator = self.getEvaluator()
+            evaluator.field, evaluator.startingPosition = field, startingPosition
+            tasks.append((s, evaluator, list(u.values())))
+        return (offspring, lookup, tasks)
+
+    def finishOffspringTask(self, task, taskResults):
+        "Records the results of evaluateWorkerTasks for an offspring batch from createOffspringTask and inserts the offspring. Returns the number of offspring inserted."
+        offspring, lookup, tasks = task
+        results = [[] for u in lookup[1]]
+        for s, fitnesses, worker, busyTime, steps in taskResults:
+            results[s] = fitnesses
+            self.individualsSimulated += len(fitnesses)
+            self.stepsSimulated += steps
+        fitnesses = self.recordFitnesses(offspring, lookup, results)
+        return self.insertOffspring(offspring, [sum(sampleFitnesses[i] for sampleFitnesses in fitnesses) for i in range(0, len(offspring))])
+
+    def insertOffspring(self, offspring, fitnesses):
+        "Puts evaluated offspring into the population in place of members chosen by selectReplacement, then updates the overselection groups. Returns the number of offspring inserted."
+        for child, fitness in zip(offspring, fitnesses):
+            index = self.selectReplacement()
+            self.population[index] = child
+            self.popFitness[index] = fitness
+            if fitness > self.maxFitness:
+                self.maxFitness = fitness
+                self.bestIndividual = child
+            self.offspringInserted += 1
+            if self.offspringInserted % self.popSize == 0:
+                self.generation += 1
+                self.checkpointIfDue()
+        self.initializeOverselection()
+        return len(offspring)
+
+    def getMigrants(self, count):
+        "Returns the count fittest individuals as (StateMachine bytes, fitness) tuples, to send to other islands"
+        ranked = sorted(range(0, len(self.population)), key=lambda i: self.popFitness[i], reverse=True)
+        return [(self.population[i].toBytes(), self.popFitness[i]) for i in ranked[:count]]
+
+    def receiveMigrants(self, migrants):
+        "Puts the (StateMachine bytes, fitness) migrants from another island into the population in place of members chosen by selectReplacement, so they can be selected as parents in the next generation"
+        for machineBytes, fitness in migrants:
+            migrant = StateMachine.fromBytes(machineBytes)
+            index = self.selectReplacement()
+            self.population[index] = migrant
+            self.popFitness[index] = fitness
+            if fitness > self.maxFitness:
+                self.maxFitness = fitness
+                self.bestIndividual = migrant
+        self.initializeOverselection()
+
+    def selectReplacement(self):
+        "Returns the index of a random member of the population below the overselection boundary, for an offspring to replace in steady-state mode. The best individual is never replaced."
+        boundary = self.getOverselectionBoundary()
+        candidates = [i for i in range(0, len(self.population)) if self.popFitness[i] < boundary and self.population[i] is not self.bestIndividual]
+        if len(candidates) == 0: #every member is at the boundary
+            candidates = [i for i in range(0, len(self.population)) if self.population[i] is not self.bestIndividual] or [0]
+        return random.choice(candidates)
             
     def selectParent(self):
         "Selects a parent from highPop with the probability of the probabilityHighParent value, otherwise selects a parent from lowPop"
@@ -395,25 +1355,29 @@ class Evolution:
         "Creates the groups of individuals for Overselection using the percentile value. (Percentile determines what percent of individuals go in the highPop list)"
         self.highPop = []
         self.lowPop = []
-        fitness = self.popFitness[:]
-        fitness.sort()
         #put top x% in high list
-        boundary = fitness[int(self.popSize*((100 - self.selectionPercentile)/100))]
+        boundary = self.getOverselectionBoundary()
         for index, p in enumerate(self.population):
             if self.popFitness[index] >= boundary:
                 self.highPop+=[p]
             else:
                 self.lowPop+=[p]
                 
+    def getOverselectionBoundary(self):
+        "Returns the lowest fitness in the top selectionPercentile percent of the population"
+        fitness = self.popFitness[:]
+        fitness.sort()
+        return fitness[int(self.popSize*((100 - self.selectionPercentile)/100))]
+
     def crossover(self, a, b):
         "Combines 'a' and 'b' to create child. Chooses 50% of genes in 'a' to replace/add in 'b'"
         aKeys = list(a.statesDict.keys())
         bCopy = b.copyMachine()
         for i in range(0, int(len(aKeys)/2)):
             key = random.choice(aKeys)
-            bCopy.replaceOrAddState(a.statesDict.get(key))
+            bCopy.replaceOrAddState(a.statesDict.get(key).copyState()) #copied so that mutating the child can't change 'a'
             aKeys.remove(key)
-        #b.purgeIslands() #TODO: Investigate performance repercussions of the purgeIslands() call here. Consider moving elsewhere.
+        bCopy.purgeIslands()
         return bCopy
     
     def mutate(self, individual):
@@ -480,6 +1444,7 @@ class Evolution:
                     individual.statesDict.get(key).breakState = random.choice(list(individual.statesDict.keys()))
                 else: #modify breakAfter
                     individual.statesDict.get(key).breakAfter = random.choice((-1, random.randint(0, 1000)))
+            individual.purgeIslands()
         return individual
     
     def getBestIndividual(self):
@@ -487,8 +1452,456 @@ class Evolution:
         return self.bestIndividual
 
 
+def evaluateWorkerTask(task):
+    "Evaluates a chunk of individuals in a worker process. Parameters: task: a tuple of (sample number, evaluator Evolution, individuals). Returns a tuple of (sample number, fitness list, worker process id, seconds spent evaluating, movements simulated)"
+    i, evaluator, population = task
+    start = time.perf_counter()
+    steps = evaluator.stepsSimulated
+    fitnesses = evaluator.evaluateIndividuals(population)
+    return (i, fitnesses, os.getpid(), time.perf_counter() - start, evaluator.stepsSimulated - steps)
+
+
+def evaluateWorkerTasks(tasks):
+    "Evaluates several evaluateWorkerTask tasks in one worker process and returns a list of their results"
+    return [evaluateWorkerTask(task) for task in tasks]
+
+
+def evaluateQueuedTask(task, fitnessQueue):
+    "Evaluates a chunk of individuals in a process started for a single Field and puts the result of evaluateWorkerTask on the fitnessQueue"
+    fitnessQueue.put(evaluateWorkerTask(task))
+
+
+def evaluateOffspringTask(task):
+    "Evaluates a batch of individuals for a worker daemon, or in the coordinator when no daemon is reachable. Parameters: task: a tuple of (evaluator Evolution for each Field, individuals). Returns a tuple of (each individual's fitness summed over the Fields, movements simulated)"
+    evaluators, offspring = task
+    fitnesses = [0]*len(offspring)
+    steps = 0
+    for evaluator in evaluators:
+        steps -= evaluator.stepsSimulated
+        for i, fitness in enumerate(evaluator.evaluateIndividuals(offspring)):
+            fitnesses[i] += fitness
+        steps += evaluator.stepsSimulated
+    return (fitnesses, steps)
+
+
+def runIsland(index, settings, seed, generations, migrationInterval, migrantCount, sendConnections, receiveConnections, resultConnection):
+    "Runs one island of an IslandModel in its own process. Every migrationInterval generations, sends the fittest migrantCount individuals to each neighbour and waits for the migrants of each island that sends to this one. Each send runs on its own thread, so islands never wait on each other to receive however large the migrants are. Neighbours that exit are left out from then on. Sends a tuple of (island index, best individual bytes, max fitness, individuals simulated, movements simulated, migrants received, seconds taken) to the result connection when done."
+    random.seed(seed)
+    start = time.perf_counter()
+    evolution = Evolution(settings.get("popSize", 0))
+    evolution.threadCount = 1 #the island is already one of many processes
+    for attribute, value in settings.items():
+        setattr(evolution, attribute, value)
+    migrantsReceived = 0
+    try:
+        evolution.initializePopulation()
+        for generation in range(1, generations + 1):
+            evolution.nextGeneration()
+            if generation % migrationInterval == 0 and generation < generations:
+                migrants = evolution.getMigrants(migrantCount)
+                brokenConnections = [] #send connections whose neighbour has exited
+                senders = [threading.Thread(target=sendMigrants, args=(connection, migrants, brokenConnections)) for connection in sendConnections]
+                for sender in senders:
+                    sender.start()
+                for connection in list(receiveConnections):
+                    try:
+                        received = connection.recv()
+                    except EOFError: #the neighbour stopped, so carry on without it
+                        receiveConnections.remove(connection)
+                        continue
+                    evolution.receiveMigrants(received)
+                    migrantsReceived += len(received)
+                for sender in senders:
+                    sender.join()
+                for connection in brokenConnections:
+                    sendConnections.remove(connection)
+                    connection.close()
+    finally:
+        evolution.shutdownWorkerPool()
+        for connection in sendConnections:
+            connection.close()
+    resultConnection.send((index, evolution.bestIndividual.toBytes(), evolution.maxFitness, evolution.individualsSimulated, evolution.stepsSimulated, migrantsReceived, time.perf_counter() - start))
+    resultConnection.close()
+
+
+def sendMigrants(connection, migrants, brokenConnections):
+    "Sends migrants to a neighbouring island. Adds the connection to brokenConnections instead if the neighbour has exited."
+    try:
+        connection.send(migrants)
+    except OSError: #BrokenPipeError when the neighbour's end is closed
+        brokenConnections.append(connection)
+
+
+class IslandModel:
+    "Evolves several independent Evolution populations, each in its own process, that periodically send their fittest individuals to neighbouring islands over pipes. Islands only wait on their own neighbours, so there is no central coordinator."
+    def __init__(self, islandCount, popSize):
+        "Constructor"
+        self.islandCount = islandCount #The number of islands, each run in its own process
+        self.popSize = popSize #The number of individuals on each island
+        self.migrationInterval = 5 #The number of generations between migrations
+        self.migrantCount = 2 #The number of individuals each island sends to each neighbour per migration
+        self.topology = "ring" #"ring" to send migrants to the next island, "fullyConnected" to send them to every other island, or "none" for no migration
+        self.settings = {} #Evolution attributes to set on every island, keyed by name
+        self.islandSettings = {} #Evolution attributes for particular islands, keyed by island index, that override settings
+        self.bestIndividual = None #The best individual found by any island
+        self.maxFitness = 0 #The fitness of bestIndividual on its own island
+        self.islandResults = [] #The (island index, best individual, max fitness, individuals simulated, movements simulated, migrants received, seconds taken) of each island after the last run
+
+    def getNeighbours(topology, islandCount):
+        "Returns a list with the indices of the islands each island sends migrants to under the given topology"
+        if topology == "ring":
+            return [[(i + 1) % islandCount] if islandCount > 1 else [] for i in range(0, islandCount)]
+        if topology == "fullyConnected":
+            return [[j for j in range(0, islandCount) if j != i] for i in range(0, islandCount)]
+        if topology == "none":
+            return [[] for i in range(0, islandCount)]
+        raise RuntimeError("Unknown island topology: " + str(topology))
+
+    def run(self, generations, seed = None):
+        "Runs every island for the given number of generations and returns the best individual found. The same seed always gives each island the same random numbers. Islands are started with the spawn method, so each one holds only its own pipe ends and an island that exits shows up as the end of its pipes. If any island exits without a result, the others still finish, islandResults holds their results, and RuntimeError is raised."
+        neighbours = IslandModel.getNeighbours(self.topology, self.islandCount)
+        sendConnections = [[] for i in range(0, self.islandCount)]
+        receiveConnections = [[] for i in range(0, self.islandCount)]
+        for i in range(0, self.islandCount):
+            for j in neighbours[i]:
+                receiveEnd, sendEnd = multiprocessing.Pipe(duplex=False)
+                sendConnections[i].append(sendEnd)
+                receiveConnections[j].append(receiveEnd)
+        resultReceiveEnd, resultSendEnd = multiprocessing.Pipe(duplex=False)
+        seeds = random.Random(seed)
+        context = multiprocessing.get_context("spawn") #forked islands would inherit every other island's pipe ends
+        processes = [context.Process(target=runIsland, args=(i, dict(self.settings, popSize=self.popSize, **self.islandSettings.get(i, {})), seeds.getrandbits(64), generations, self.migrationInterval, self.migrantCount, sendConnections[i], receiveConnections[i], resultSendEnd)) for i in range(0, self.islandCount)]
+        for p in processes:
+            p.start()
+        #Close this process's copies of the islands' pipe ends, so only the islands hold them
+        for connection in [c for connections in sendConnections + receiveConnections for c in connections] + [resultSendEnd]:
+            connection.close()
+        results = []
+        try:
+            while len(results) < self.islandCount:
+                results.append(resultReceiveEnd.recv())
+        except EOFError: #every island has exited
+            pass
+        finally:
+            for p in processes:
+                p.join()
+            resultReceiveEnd.close()
+        results.sort(key=lambda result: result[0])
+        self.islandResults = [(index, StateMachine.fromBytes(machineBytes), fitness, simulated, steps, migrants, elapsed) for index, machineBytes, fitness, simulated, steps, migrants, elapsed in results]
+        if len(results) < self.islandCount:
+            raise RuntimeError(str(self.islandCount - len(results)) + " island processes exited without a result")
+        best = max(self.islandResults, key=lambda result: result[2])
+        self.bestIndividual, self.maxFitness = best[1], best[2]
+        return self.bestIndividual
+
+
+def sendMessage(connection, kind, payload):
+    "Sends a message of the worker daemon protocol on the socket: a 4 byte kind and the payload length, followed by the payload"
+    connection.sendall(struct.pack("<4sI", kind, len(payload)) + payload)
+
+def receiveMessage(connection):
+    "Receives a message sent by sendMessage from the socket and returns its (kind, payload). Raises EOFError if the connection closes."
+    kind, length = struct.unpack("<4sI", receiveExactly(connection, 8))
+    if length > 1 << 30:
+        raise RuntimeError("Message of " + str(length) + " bytes is too large")
+    return kind, receiveExactly(connection, length)
+
+def receiveExactly(connection, count):
+    "Receives exactly count bytes from the socket. Raises EOFError if the connection closes first."
+    data = bytearray()
+    while len(data) < count:
+        chunk = connection.recv(min(count - len(data), 1 << 20))
+        if len(chunk) == 0:
+            raise EOFError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+class WorkerDaemon:
+    "Evaluates individuals for coordinators connecting over TCP. Each connection is served by its own thread. Coordinators first send each Field with its evaluation settings in a FELD message, then EVAL messages with the key of a Field and serialized StateMachines, which are answered with a FITS message holding their fitnesses, or a MISS message if the Field is no longer cached. Messages hold no pickles, but anyone who can connect can use the daemon, so it listens on localhost unless told otherwise."
+    def __init__(self, host = "127.0.0.1", port = 0):
+        "Constructor"
+        self.listener = socket.create_server((host, port)) #The socket accepting coordinator connections
+        self.address = self.listener.getsockname()[:2] #The (host, port) the daemon listens on. Port 0 picks a free port.
+        self.fieldCacheSize = 64 #The number of evaluators kept for each connection, most recently used first
+        self.connections = set() #The open coordinator connections
+        self.tasksEvaluated = 0 #The number of EVAL messages answered
+        self.running = True #False once stop is called
+        self.thread = None #The thread running serveForever, if start was called
+
+    def start(self):
+        "Serves coordinators in a background thread and returns immediately"
+        self.thread = threading.Thread(target=self.serveForever, daemon=True)
+        self.thread.start()
+
+    def serveForever(self):
+        "Accepts coordinator connections until stop is called, serving each one in its own thread"
+        while self.running:
+            try:
+                connection, address = self.listener.accept()
+            except OSError: #the listener was closed by stop
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections.add(connection)
+            threading.Thread(target=self.serveConnection, args=(connection,), daemon=True).start()
+
+    def stop(self):
+        "Stops accepting connections and closes the open ones, as if the host left"
+        self.running = False
+        WorkerDaemon.closeConnection(self.listener) #shutting it down wakes the accept in serveForever
+        for connection in list(self.connections):
+            WorkerDaemon.closeConnection(connection)
+        if self.thread != None:
+            self.thread.join()
+
+    def closeConnection(connection):
+        "Shuts down and closes the socket, ignoring errors from a socket that is already closed"
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+
+    def serveConnection(self, connection):
+        "Answers the messages of one coordinator until it disconnects"
+        evaluators = OrderedDict() #evaluator Evolutions keyed to their Field keys, least recently used first
+        try:
+            while self.running:
+                kind, payload = receiveMessage(connection)
+                if kind == b"FELD":
+                    key, evaluator = WorkerDaemon.decodeEvaluator(payload)
+                    evaluators[key] = evaluator
+                    evaluators.move_to_end(key)
+                    if len(evaluators) > self.fieldCacheSize:
+                        evaluators.popitem(last=False)
+                elif kind == b"EVAL":
+                    key = payload[:16]
+                    if key not in evaluators:
+                        sendMessage(connection, b"MISS", key)
+                        continue
+                    evaluators.move_to_end(key)
+                    result = evaluateOffspringTask(([evaluators[key]], RemoteWorkerPool.decodeMachines(payload[16:])))
+                    self.tasksEvaluated += 1
+                    sendMessage(connection, b"FITS", RemoteWorkerPool.encodeFitnesses(result))
+                else:
+                    raise RuntimeError("Unknown message kind " + repr(kind))
+        except (EOFError, OSError): #the coordinator disconnected or stop was called
+            pass
+        except Exception as error: #a malformed message
+            try:
+                sendMessage(connection, b"FAIL", str(error).encode("utf-8"))
+            except OSError:
+                pass
+        finally:
+            self.connections.discard(connection)
+            connection.close()
+
+    def decodeEvaluator(payload):
+        "Returns the (Field key, evaluator Evolution) of a FELD message created by RemoteWorkerPool.encodeEvaluator"
+        key = payload[:16]
+        headerLength, = struct.unpack_from("<I", payload, 16)
+        header = json.loads(payload[20:20 + headerLength].decode("utf-8"))
+        cells = payload[20 + headerLength:]
+        evaluator = Evolution.__new__(Evolution)
+        for attribute in ("evalMovements", "evaluationBlockedShortcut", "simulator", "cycleDetection"):
+            setattr(evaluator, attribute, header[attribute])
+        if numpy != None:
+            evaluator.field = NumpyField.fromBytes(header["width"], header["height"], header["filler"], cells)
+        else:
+            evaluator.field = Field.fromBytes(header["width"], header["height"], header["filler"], cells)
+        evaluator.startingPosition = Coordinate(header["x"], header["y"])
+        evaluator.visitedCells = None
+        evaluator.visitedMarker = 0
+        evaluator.stepsSimulated = 0
+        return key, evaluator
+
+
+class RemoteWorkerPool:
+    "Sends evaluation tasks to WorkerDaemons over pooled TCP connections, keeping pipelineDepth tasks queued on each daemon. Daemons can join or leave at any time: unreachable addresses are retried every reconnectInterval seconds, and the tasks of a daemon that disconnects or stops answering go to the others. If no daemon is reachable, tasks are evaluated in this process."
+    def __init__(self, addresses):
+        "Constructor"
+        self.addresses = list(addresses) #The "host:port" address of each worker daemon. Addresses can be added or removed at any time.
+        self.connections = {} #Open sockets keyed to their addresses
+        self.sentFields = {} #The keys of the Fields sent on each connection, keyed to its address, least recently used first
+        self.lastConnectAttempt = {} #The time of the last failed connection attempt, keyed to address
+        self.pipelineDepth = 2 #The number of tasks sent to each daemon before waiting for its answers, so daemons never wait for the next task
+        self.fieldCacheSize = 64 #The number of Fields assumed to be cached by each daemon. Matches WorkerDaemon.fieldCacheSize.
+        self.connectTimeout = 1 #Seconds to wait when connecting to a daemon
+        self.taskTimeout = 60 #Seconds to wait for an answer before giving up on the daemons with tasks outstanding
+        self.reconnectInterval = 1 #Seconds between attempts to connect to an unreachable daemon
+        self.workerFailures = 0 #The number of times a connected daemon disconnected or stopped answering
+        self.tasksEvaluated = {} #The number of tasks each daemon evaluated, keyed to address
+        self.tasksEvaluatedLocally = 0 #The number of tasks evaluated in this process because no daemon was reachable
+
+    def connect(self):
+        "Connects to the addresses without a connection, skipping those that failed less than reconnectInterval seconds ago, and closes connections to addresses that were removed"
+        for address in list(self.connections):
+            if address not in self.addresses:
+                self.disconnect(address)
+        now = time.perf_counter()
+        for address in self.addresses:
+            if address in self.connections or now - self.lastConnectAttempt.get(address, -math.inf) < self.reconnectInterval:
+                continue
+            host, port = address.rsplit(":", 1)
+            try:
+                connection = socket.create_connection((host, int(port)), timeout=self.connectTimeout)
+            except OSError:
+                self.lastConnectAttempt[address] = now
+                continue
+            connection.settimeout(self.taskTimeout)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections[address] = connection
+            self.sentFields[address] = OrderedDict()
+
+    def disconnect(self, address):
+        "Closes the connection to the address"
+        WorkerDaemon.closeConnection(self.connections.pop(address))
+        del self.sentFields[address]
+
+    def close(self):
+        "Closes every connection"
+        for address in list(self.connections):
+            self.disconnect(address)
+
+    def evaluate(self, tasks):
+        "Evaluates each (evaluator Evolution, individuals) task on the worker daemons and returns a list with the (fitness list, movements simulated) of each task"
+        results = [None]*len(tasks)
+        pending = list(range(len(tasks)-1, -1, -1)) #indices of tasks to send, next task last
+        outstanding = {} #indices of the tasks sent on each connection, oldest first, keyed to address
+        machines = {} #encoded individuals of each task, keyed to task index
+        fields = {} #(Field key, FELD payload) of each evaluator, keyed to its id
+        try:
+            while len(pending) > 0 or any(len(sent) > 0 for sent in outstanding.values()):
+                self.connect()
+                for address in list(outstanding):
+                    if address not in self.connections: #removed from addresses by connect
+                        pending.extend(reversed(outstanding.pop(address)))
+                if len(self.connections) == 0:
+                    if len(pending) > 0: #no daemon is reachable, so evaluate here rather than wait
+                        t = pending.pop()
+                        results[t] = tuple(evaluateOffspringTask(([tasks[t][0]], tasks[t][1])))
+                        self.tasksEvaluatedLocally += 1
+                    continue
+                for address, connection in list(self.connections.items()):
+                    sent = outstanding.setdefault(address, [])
+                    try:
+                        while len(pending) > 0 and len(sent) < self.pipelineDepth:
+                            t = pending[-1]
+                            evaluator, individuals = tasks[t]
+                            if id(evaluator) not in fields:
+                                fields[id(evaluator)] = RemoteWorkerPool.encodeEvaluator(evaluator)
+                            key, fieldPayload = fields[id(evaluator)]
+                            if key not in self.sentFields[address]:
+                                sendMessage(connection, b"FELD", fieldPayload)
+                            self.rememberField(address, key)
+                            if t not in machines:
+                                machines[t] = RemoteWorkerPool.encodeMachines(individuals)
+                            sendMessage(connection, b"EVAL", key + machines[t])
+                            sent.append(pending.pop())
+                    except OSError:
+                        self.dropConnection(address, outstanding, pending)
+                waiting = [self.connections[address] for address, sent in outstanding.items() if len(sent) > 0]
+                if len(waiting) == 0:
+                    continue
+                readable = select.select(waiting, [], [], self.taskTimeout)[0]
+                if len(readable) == 0: #every daemon with tasks outstanding stopped answering
+                    for address in [address for address, sent in outstanding.items() if len(sent) > 0]:
+                        self.dropConnection(address, outstanding, pending)
+                    continue
+                for address in [address for address, connection in self.connections.items() if connection in readable]:
+                    try:
+                        kind, payload = receiveMessage(self.connections[address])
+                    except (EOFError, OSError):
+                        self.dropConnection(address, outstanding, pending)
+                        continue
+                    t = outstanding[address].pop(0) #daemons answer in the order tasks were sent
+                    if kind == b"FITS":
+                        results[t] = RemoteWorkerPool.decodeFitnesses(payload)
+                        self.tasksEvaluated[address] = self.tasksEvaluated.get(address, 0) + 1
+                    elif kind == b"MISS": #the daemon dropped the Field from its cache, so send it again
+                        self.sentFields[address].pop(payload, None)
+                        pending.append(t)
+                    else:
+                        self.disconnect(address) #the daemon closes the connection after a FAIL
+                        raise RuntimeError("Worker daemon " + address + " answered " + repr(kind) + ": " + payload.decode("utf-8", "replace"))
+        finally:
+            #After an error, answers to tasks still outstanding would be read by the next call as answers to its own tasks
+            for address, sent in outstanding.items():
+                if len(sent) > 0 and address in self.connections:
+                    self.disconnect(address)
+        return results
+
+    def rememberField(self, address, key):
+        "Records that the daemon at the address has the Field with the given key cached, forgetting the least recently used Field once more than fieldCacheSize are cached"
+        sentFields = self.sentFields[address]
+        sentFields[key] = True
+        sentFields.move_to_end(key)
+        if len(sentFields) > self.fieldCacheSize:
+            sentFields.popitem(last=False)
+
+    def dropConnection(self, address, outstanding, pending):
+        "Disconnects from a daemon that failed and puts its outstanding tasks back in pending"
+        self.workerFailures += 1
+        pending.extend(reversed(outstanding.pop(address, [])))
+        self.disconnect(address)
+        self.lastConnectAttempt[address] = time.perf_counter()
+
+    def encodeEvaluator(evaluator):
+        "Returns the (Field key, FELD payload) of an evaluator Evolution. The key is a digest of the Field, starting position and evaluation settings, so the same Field is only sent to each daemon once."
+        header = {"width": evaluator.field.width, "height": evaluator.field.height, "filler": evaluator.field.defaultFiller, "x": evaluator.startingPosition.x, "y": evaluator.startingPosition.y}
+        for attribute in ("evalMovements", "evaluationBlockedShortcut", "simulator", "cycleDetection"):
+            header[attribute] = getattr(evaluator, attribute)
+        headerBytes = json.dumps(header, sort_keys=True).encode("utf-8")
+        cells = evaluator.field.toBytes()
+        key = hashlib.blake2b(headerBytes + cells, digest_size=16).digest()
+        return key, key + struct.pack("<I", len(headerBytes)) + headerBytes + cells
+
+    def encodeMachines(individuals):
+        "Returns the individuals as a count followed by the length and bytes of each StateMachine"
+        data = bytearray(struct.pack("<I", len(individuals)))
+        for individual in individuals:
+            machineBytes = individual.toBytes()
+            data += struct.pack("<I", len(machineBytes))
+            data += machineBytes
+        return bytes(data)
+
+    def decodeMachines(data):
+        "Returns the StateMachines encoded by encodeMachines"
+        count, = struct.unpack_from("<I", data, 0)
+        offset = 4
+        machines = []
+        for i in range(0, count):
+            length, = struct.unpack_from("<I", data, offset)
+            machines.append(StateMachine.fromBytes(data[offset + 4:offset + 4 + length]))
+            offset += 4 + length
+        return machines
+
+    def encodeFitnesses(result):
+        "Returns the (fitness list, movements simulated) of a task as the FITS payload"
+        fitnesses, steps = result
+        return struct.pack("<Iq" + str(len(fitnesses)) + "q", len(fitnesses), steps, *fitnesses)
+
+    def decodeFitnesses(payload):
+        "Returns the (fitness list, movements simulated) encoded by encodeFitnesses"
+        count, steps = struct.unpack_from("<Iq", payload, 0)
+        return (list(struct.unpack_from("<" + str(count) + "q", payload, 12)), steps)
+
+
+def generateCorpusField(task):
+    "Generates one Field for a FieldCorpus. Parameters: task: a tuple of (field generator Evolution, random seed). Returns a tuple of (Field bytes, starting x, starting y)"
+    generator, seed = task
+    randomState = random.getstate()
+    random.seed(seed)
+    generator.generateField()
+    while generator.startingPosition == None: #the Field has no open cell
+        generator.generateField()
+    random.setstate(randomState)
+    return (generator.field.toBytes(), generator.startingPosition.x, generator.startingPosition.y)
+
+
 class Coordinate:
     "An object representing an X,Y coordinate pair"
+    __slots__ = ("x", "y")
     def __init__(self, x, y):
         "Constructor"
         self.x = x
@@ -541,6 +1954,10 @@ class Field:
             self.grid[x][y] = value
         return False
             
+    def toArray(self):
+        "Returns the field values as a NumPy array indexed by [x, y]"
+        return numpy.array(self.grid)
+            
     def getValueAtCoordinate(self, coordinate):
         "Returns the value at the coordinate"
         if (coordinate.x < self.width) and (coordinate.y < self.height) and (coordinate.x >= 0) and (coordinate.y >= 0):
@@ -567,136 +1984,75 @@ class Field:
                 self.writeValueAtCoordinate(coordinate, Coordinate(x, -1*y2), filler)
                 self.writeValueAtCoordinate(coordinate, Coordinate(-1*x, -1*y2), filler)
                 
-    def generateRandomShape(self, vertexCount, radius, coordinate, borderValue, filler): #Currently doesn't work. TODO: Use pygame's shape generation to draw shape
-        "Draws a random shape with given number of vertices with a max radius centered around the given coordinate, and fills it with the filler value"
+    def generateRandomShape(self, vertexCount, radius, coordinate, borderValue, filler):
+        "Draws a random polygon with the given number of vertices on a circle with the given radius centered around the given coordinate, outlines it with the border value and fills it with the filler value"
         if vertexCount < 3:
             return
-        vertices = set()
-        averageX = 0
-        averageY = 0
-        self.generateCircle(radius, coordinate, borderValue, filler)
+        #vertices sorted by angle around the center always form a simple polygon
+        angles = sorted(random.uniform(0, 2*math.pi) for i in range(0, vertexCount))
+        vertices = [(coordinate.x + int(round(radius*math.cos(angle))), coordinate.y + int(round(radius*math.sin(angle)))) for angle in angles]
+        self.fillPolygon(vertices, filler)
         for i in range(0, vertexCount):
-            x = random.randint(-1*(radius), radius)
-            y = int(round(math.sqrt((radius*radius) - (x*x))))*random.choice((-1, 1))
-            averageX += x
-            averageY += y
-            vertices.add(Coordinate(x, y))
-        averageCoordinate = Coordinate(int((averageX/vertexCount)+coordinate.x), int((averageY/vertexCount)+coordinate.y))
-        shapeField = Field(2*radius, 2*radius, self.defaultFiller)
-        fieldOffset = Coordinate(coordinate.x + radius, coordinate.y + radius)
-        shapeOffset = Coordinate(radius, radius)
-        firstV = None
-        #lastV = None
-        lineCounter = 0
-        verticesSize = len(vertices)
-        allConnected = False
-        foundVertex = None
-        for x in range(-1*radius, radius):
-            if allConnected:
-                break;
-            #find first vertex with positive y, link it with next vertex with positive y
-            for vert in vertices:
-                if (lineCounter == verticesSize - 1):
-                    shapeField.drawLine(Coordinate(foundVertex.x, foundVertex.y), Coordinate(firstV.x, firstV.y), borderValue, shapeOffset, True)
-                    allConnected = True
-                    break;
-                if (vert.x == x and vert.y >= 0):
-                    if (foundVertex == None):
-                        foundVertex = vert
-                        firstV = vert
-                    else:
-                        shapeField.drawLine(Coordinate(foundVertex.x, foundVertex.y), Coordinate(vert.x, vert.y), borderValue, shapeOffset, True)
-                        foundVertex = vert
-                        lineCounter += 1
-        for x in range(-1*radius, radius):
-            if allConnected:
-                break;
-            #find first vertex with negative y, link it with next vertex with negative y
-            oppX = x *-1
-            for vert in vertices:
-                if (lineCounter == verticesSize - 1):
-                    shapeField.drawLine(Coordinate(foundVertex.x, foundVertex.y), Coordinate(firstV.x, firstV.y), borderValue, shapeOffset, True)
-                    allConnected = True
-                    break;
-                if (vert.x == oppX and vert.y < 0):
-                    if (foundVertex == None):
-                        foundVertex = vert
-                        firstV = vert
-                    else:
-                        shapeField.drawLine(Coordinate(foundVertex.x, foundVertex.y), Coordinate(vert.x, vert.y), borderValue, shapeOffset, True)
-                        foundVertex = vert
-                        lineCounter += 1
-        #self.fillArea(averageCoordinate, filler, borderValue)
-        runningCoordinate = None
-        radius+= 10
-        for x in range(-1*radius, radius):
-            edgeY = int(round(math.sqrt((radius*radius) - (x*x))))
-            fillCoordinates = []
-            withinBorders = False
-            #from (x, -y) to (x, y)
-            for y in range(-1*edgeY, edgeY):
-                runningCoordinate = Coordinate(x+radius, y+radius)
-                previousCoordinate = Coordinate(x+radius, y+radius-1)
-                if (shapeField.getValueAtCoordinate(runningCoordinate) == borderValue and shapeField.getValueAtCoordinate(previousCoordinate) != borderValue):
-                    withinBorders = not withinBorders
-                elif withinBorders:
-                    fillCoordinates += [runningCoordinate]
-                    #self.writeValueAtCoordinate(runningCoordinate, coordinate, filler)
-            if not withinBorders and len(fillCoordinates) > 0:
-                for c in fillCoordinates:
-                    shapeField.writeValueAtCoordinate(c, Coordinate(0,0), filler)
-        self.transferFrom(shapeField, fieldOffset)
-
-    def transferFrom(self, otherField, offset):
-        for x in range(otherField.width):
-            for y in range(otherField.height):
-                X = x + offset.x
-                Y = y + offset.y
-                value = otherField.grid[x][y]
-                if (X < self.width) and (Y < self.height) and (X >= 0) and (Y >= 0):
-                    if (value != otherField.defaultFiller):
-                        self.grid[X][Y] = value
-        
-    def drawLine(self, a, b, value, offset, edgeCorrect = False): #TODO: Allow line to have an approximate slope to avoid noticeable staircasing
-        "Draws a line between coordinate A and coordinate B using the value given"
+            a = vertices[i - 1]
+            b = vertices[i]
+            self.drawLine(Coordinate(a[0], a[1]), Coordinate(b[0], b[1]), borderValue, Coordinate(0, 0))
+
+    def fillPolygon(self, vertices, filler):
+        "Fills the simple polygon with the given list of (x, y) vertices with the filler value, one column span at a time"
+        edges = [] #(left x, right x, left y, slope) of each edge that isn't vertical
+        for i in range(0, len(vertices)):
+            (x0, y0), (x1, y1) = vertices[i - 1], vertices[i]
+            if x0 != x1:
+                if x0 > x1:
+                    x0, y0, x1, y1 = x1, y1, x0, y0
+                edges.append((x0, x1, y0, (y1 - y0) / (x1 - x0)))
+        if len(edges) == 0:
+            return
+        left = max(min(edge[0] for edge in edges), 0)
+        right = min(max(edge[1] for edge in edges), self.width - 1)
+        for x in range(left, right + 1):
+            #each edge covers the columns from its left x up to but not including its right x, so shared vertices are only counted once
+            crossings = sorted(y0 + (x - x0)*slope for x0, x1, y0, slope in edges if x0 <= x < x1)
+            for i in range(0, len(crossings) - 1, 2):
+                bottom = max(math.ceil(crossings[i]), 0)
+                top = min(math.floor(crossings[i + 1]), self.height - 1)
+                if bottom <= top:
+                    self.fillColumn(x, bottom, top + 1, filler)
+
+    def fillColumn(self, x, start, end, value):
+        "Writes the value to column x from y=start up to but not including y=end"
+        self.grid[x][start:end] = [value]*(end - start)
+
+    def drawLine(self, a, b, value, offset, edgeCorrect = False):
+        "Draws a line between coordinate A and coordinate B using the value given, using Bresenham's algorithm. Points off the field are skipped, or moved to the nearest edge if edgeCorrect is True."
         if a == None or b == None:
             return
-        rise = b.y - a.y
-        run = b.x - a.x
-        riseAmt = 1 if rise >= 0 else -1
-        runAmt = 1 if run >= 0 else -1
-        absRise = abs(rise)
-        absRun = abs(run)
-        currentCoordinate = a.copy()
-        self.writeValueAtCoordinate(currentCoordinate, offset, value)
-        if (absRise > absRun):
-            interval = int(absRise / absRun)+1 if absRun != 0 else 100000000
-            remainder = absRise % absRun  if absRun != 0 else 0
-            runCount = 0
-            for i in range(1, absRise+1):
-                currentCoordinate.y += riseAmt
-                self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
-                if ((i % interval) == 0):
-                    runCount += 1
-                    currentCoordinate.x += runAmt
-                    self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
-            for i in range(absRun - runCount):
-                currentCoordinate.x += runAmt
-                self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
-        else:
-            interval = int(absRun / absRise)+1 if absRise != 0 else 100000000
-            remainder = absRun % absRise  if absRise != 0 else 0
-            riseCount = 0
-            for i in range(1, absRun+1):
-                currentCoordinate.x += runAmt
-                self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
-                if ((i % interval) == 0):
-                    riseCount += 1
-                    currentCoordinate.y += riseAmt
-                    self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
-            for i in range(absRise - riseCount):
-                currentCoordinate.y += riseAmt
-                self.writeValueAtCoordinate(currentCoordinate, offset, value, edgeCorrect)
+        x = a.x + offset.x
+        y = a.y + offset.y
+        endX = b.x + offset.x
+        endY = b.y + offset.y
+        runAmt = 1 if endX >= x else -1
+        riseAmt = 1 if endY >= y else -1
+        absRun = abs(endX - x)
+        absRise = -abs(endY - y)
+        error = absRun + absRise
+        grid = self.grid
+        width = self.width
+        height = self.height
+        while True:
+            if x >= 0 and y >= 0 and x < width and y < height:
+                grid[x][y] = value
+            elif edgeCorrect:
+                grid[0 if x < 0 else width-1 if x >= width else x][0 if y < 0 else height-1 if y >= height else y] = value
+            if x == endX and y == endY:
+                break
+            doubleError = 2*error
+            if doubleError >= absRise:
+                error += absRise
+                x += runAmt
+            if doubleError <= absRun:
+                error += absRun
+                y += riseAmt
                 
     def fillArea(self, coordinate, filler, border, count =0):
         "Fills an enclosed area, containing the given coordinate and defined by the given border value, with the given filler"
@@ -721,6 +2077,25 @@ class Field:
             self.grid[0][y] = border #left border
             self.grid[self.width-1][y] = border #right border
             
+    def toBytes(self):
+        "Returns the values of this Field as bytes, one byte per cell, column by column"
+        return bytes(value for column in self.grid for value in column)
+
+    def fromBytes(width, height, filler, data):
+        "Returns a new Field with the given dimensions holding the cell values created by toBytes"
+        field = Field(width, height, filler)
+        field.grid = [list(data[x*height:(x + 1)*height]) for x in range(0, width)]
+        return field
+
+    def getFilledCells(self):
+        "Returns a list of (x, y, value) tuples for each cell that doesn't hold the default filler, ordered by x and then y"
+        filledCells = []
+        for x in range(0, self.width):
+            for y in range(0, self.height):
+                if self.grid[x][y] != self.defaultFiller:
+                    filledCells.append((x, y, self.grid[x][y]))
+        return filledCells
+            
     def getOpenCoordinate(self):
         "Get random open coordinate. Will loop through field after 10000 random attempts."
         count = 0
@@ -736,8 +2111,234 @@ class Field:
                     return Coordinate(x,y)
         return None
 
+class BufferField(Field):
+    "A Field stored in a single byte buffer with one byte per cell, column by column. Cell values must fit in a byte."
+    def __init__(self, width, height, filler, buffer):
+        "Constructor. The buffer must hold width*height bytes and is used as is, without being filled."
+        self.width = width #width of field
+        self.height = height #height of field
+        self.defaultFiller = filler #default filler for field background
+        self.cells = memoryview(buffer).cast('B')[:width*height] #All field values, with the value at (x, y) at index x*height + y
+        self.grid = [self.cells[x*height:(x+1)*height] for x in range(0, width)] #A view of each column, so grid[x][y] works as in Field
+
+    def toArray(self):
+        "Returns a NumPy array indexed by [x, y] that shares the buffer of this Field"
+        return numpy.frombuffer(self.cells, numpy.uint8).reshape(self.width, self.height)
+
+    def generateCircle(self, radius, coordinate, borderValue, filler):
+        "Adds a circle with the given radius centered around the given coordinate with the border defined by the given value and filled in with the given filler value. Uses NumPy when available, writing the same cells as Field.generateCircle."
+        if numpy == None:
+            return Field.generateCircle(self, radius, coordinate, borderValue, filler)
+        left = max(coordinate.x - radius, 0)
+        right = min(coordinate.x + radius, self.width - 1)
+        bottom = max(coordinate.y - radius, 0)
+        top = min(coordinate.y + radius, self.height - 1)
+        if left > right or bottom > top:
+            return
+        #Field.generateCircle writes, for each x from 0 to radius, the border at (x, edge(x)) and (edge(x), x) and then fills (x, 0) to (x, edge(x)-1), mirrored into all four quadrants.
+        #Each cell keeps the last value written to it, so find the last write to each cell in the box around the circle.
+        edges = numpy.array([int(round(math.sqrt((radius*radius) - (x*x)))) for x in range(0, radius+1)])
+        a = numpy.abs(numpy.arange(left, right + 1) - coordinate.x)[:, None] #distance from the center along x
+        b = numpy.abs(numpy.arange(bottom, top + 1) - coordinate.y)[None, :] #distance from the center along y
+        #order of the last fill and border writes to each cell: 2x for the border written in iteration x, 2x+1 for the fill, -1 for none
+        fillOrder = numpy.where(b < edges[a], 2*a + 1, -1)
+        borderOrder = numpy.maximum(numpy.where(b == edges[a], 2*a, -1), numpy.where(a == edges[b], 2*b, -1))
+        box = self.toArray()[left:right + 1, bottom:top + 1]
+        box[fillOrder > borderOrder] = filler
+        box[borderOrder > fillOrder] = borderValue
+
+    def drawFieldBorder(self, border):
+        "Draws a border around the field. Uses NumPy when available."
+        if numpy == None:
+            return Field.drawFieldBorder(self, border)
+        cells = self.toArray()
+        cells[:, self.height-1] = border #top border
+        cells[:, 0:2] = border #bottom border
+        cells[0, :] = border #left border
+        cells[self.width-1, :] = border #right border
+
+    def fillColumn(self, x, start, end, value):
+        "Writes the value to column x from y=start up to but not including y=end"
+        self.grid[x][start:end] = bytes((value,))*(end - start)
+
+    def toBytes(self):
+        "Returns the values of this Field as bytes, one byte per cell, column by column"
+        return self.cells.tobytes()
+
+    def getFilledCells(self):
+        "Returns a list of (x, y, value) tuples for each cell that doesn't hold the default filler, ordered by x and then y. Uses NumPy when available."
+        if numpy == None:
+            return Field.getFilledCells(self)
+        cells = self.toArray()
+        filled = cells != self.defaultFiller
+        return [(x, y, value) for (x, y), value in zip(numpy.argwhere(filled).tolist(), cells[filled].tolist())]
+
+    def releaseViews(self):
+        "Releases the views into the buffer. The Field can't be used afterwards."
+        for column in self.grid:
+            column.release()
+        self.grid = []
+        self.cells.release()
+
+
+class NumpyField(BufferField):
+    "A Field stored in a NumPy array. Requires NumPy."
+    def __init__(self, width, height, filler):
+        "Constructor"
+        self.array = numpy.full((width, height), filler, numpy.uint8) #All field values, indexed by [x, y]
+        BufferField.__init__(self, width, height, filler, self.array)
+
+    def toArray(self):
+        "Returns the NumPy array holding the values of this Field, indexed by [x, y]"
+        return self.array
+
+    def __reduce__(self):
+        "Pickles the NumpyField as its dimensions and cell values, since the views into its array can't be pickled"
+        return (NumpyField.fromBytes, (self.width, self.height, self.defaultFiller, bytes(self.cells)))
+
+    def fromBytes(width, height, filler, data):
+        "Returns a new NumpyField with the given dimensions holding the given cell values, one byte per cell, column by column"
+        field = NumpyField(width, height, filler)
+        field.cells[:] = data
+        return field
+
+
+class SharedField(BufferField):
+    "A Field stored in shared memory. Pickling sends only its name, and unpickling attaches to the same memory without copying it."
+    def __init__(self, width, height, filler, name = None):
+        "Constructor. Creates new shared memory filled with the filler value, or attaches to the existing shared memory with the given name."
+        self.owner = name == None #True if this object created the shared memory and is responsible for freeing it
+        if self.owner:
+            self.sharedMemory = multiprocessing.shared_memory.SharedMemory(create=True, size=width*height)
+            self.sharedMemory.buf[:width*height] = bytes((filler,))*(width*height)
+        else:
+            self.sharedMemory = multiprocessing.shared_memory.SharedMemory(name=name)
+        BufferField.__init__(self, width, height, filler, self.sharedMemory.buf)
+
+    def __reduce__(self):
+        "Pickles the SharedField as its dimensions and the name of its shared memory"
+        return (SharedField, (self.width, self.height, self.defaultFiller, self.sharedMemory.name))
+
+    def close(self):
+        "Detaches from the shared memory, and frees it if this object created it"
+        if getattr(self, "sharedMemory", None) == None:
+            return
+        self.releaseViews()
+        self.sharedMemory.close()
+        if self.owner:
+            self.sharedMemory.unlink()
+        self.sharedMemory = None
+
+    def __del__(self):
+        "Detaches from the shared memory when the SharedField is garbage collected"
+        self.close()
+
+
+class FieldCorpus:
+    "A file of pre-generated Fields and their starting positions. The file is memory-mapped read-only, so every process reading it shares the same pages."
+    magic = b"EEFC" #Identifies field corpus files
+    version = 1 #The version of the file layout
+    headerFormat = "<4sIIII16s" #magic, version, Field width, Field height, Field count, corpus id. The header is followed by the starting x and y of each Field as 32-bit integers, then the cells of each Field, one byte per cell, column by column.
+    loaded = {} #The FieldCorpus objects opened with load in this process, by absolute path and corpus id, so a corpus rebuilt at the same path is opened again
+
+    def __init__(self, path):
+        "Constructor. Opens and memory-maps the corpus file at the given path."
+        self.path = os.path.abspath(path) #The absolute path of the corpus file
+        with open(self.path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) #The memory-mapped corpus file
+        self.width, self.height, self.count, self.corpusId = FieldCorpus.readHeader(self.data, self.path) #Field width, Field height, number of Fields, and the id that tells this corpus apart from others
+        self.positionsOffset = struct.calcsize(FieldCorpus.headerFormat) #The offset of the starting positions in the file
+        self.fieldsOffset = self.positionsOffset + 8*self.count #The offset of the first Field in the file
+
+    def __len__(self):
+        "Returns the number of Fields in the corpus"
+        return self.count
+
+    def getField(self, index):
+        "Returns a read-only CorpusField viewing the Field with the given index"
+        return CorpusField(self, index)
+
+    def getStartingPosition(self, index):
+        "Returns the starting Coordinate of the Field with the given index"
+        x, y = struct.unpack_from("<ii", self.data, self.positionsOffset + 8*index)
+        return Coordinate(x, y)
+
+    def readHeader(data, path):
+        "Returns the (Field width, Field height, Field count, corpus id) from the header at the start of the given corpus file data. Raises RuntimeError if the data isn't a corpus file."
+        if len(data) < struct.calcsize(FieldCorpus.headerFormat):
+            raise RuntimeError("Not a version " + str(FieldCorpus.version) + " field corpus file: " + path)
+        magic, version, width, height, count, corpusId = struct.unpack_from(FieldCorpus.headerFormat, data)
+        if magic != FieldCorpus.magic or version != FieldCorpus.version:
+            raise RuntimeError("Not a version " + str(FieldCorpus.version) + " field corpus file: " + path)
+        return width, height, count, corpusId
+
+    def load(path, corpusId = None):
+        "Returns the FieldCorpus for the file at the given path, opening each corpus only once per process. If a corpusId is given and the file now holds a different corpus, raises RuntimeError."
+        path = os.path.abspath(path)
+        if corpusId == None:
+            with open(path, "rb") as file:
+                corpusId = FieldCorpus.readHeader(file.read(struct.calcsize(FieldCorpus.headerFormat)), path)[3]
+        if (path, corpusId) not in FieldCorpus.loaded:
+            corpus = FieldCorpus(path)
+            if corpus.corpusId != corpusId:
+                raise RuntimeError("The field corpus at " + path + " was replaced by a different corpus")
+            FieldCorpus.loaded[(path, corpusId)] = corpus
+        return FieldCorpus.loaded[(path, corpusId)]
+
+    def loadField(path, corpusId, index):
+        "Returns the Field with the given index from the corpus with the given id in the file at the given path. Used to unpickle CorpusFields."
+        return FieldCorpus.load(path, corpusId).getField(index)
+
+    def create(path, generator, count, processes = 1, seed = None):
+        "Generates count Fields with the given field generator Evolution in the given number of processes, writes them to a new corpus file at the given path, and returns the opened FieldCorpus. The same seed always gives the same Fields."
+        seeds = random.Random(seed)
+        tasks = [(generator, seeds.getrandbits(64)) for i in range(0, count)]
+        cellCount = generator.fieldWidth*generator.fieldHeight
+        positionsOffset = struct.calcsize(FieldCorpus.headerFormat)
+        fieldsOffset = positionsOffset + 8*count
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "wb") as file:
+            file.write(struct.pack(FieldCorpus.headerFormat, FieldCorpus.magic, FieldCorpus.version, generator.fieldWidth, generator.fieldHeight, count, os.urandom(16)))
+            file.truncate(fieldsOffset + count*cellCount)
+            if processes > 1:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                    FieldCorpus.writeFields(file, executor.map(generateCorpusField, tasks, chunksize=max(1, count // (processes*4))), positionsOffset, fieldsOffset, cellCount)
+            else:
+                FieldCorpus.writeFields(file, map(generateCorpusField, tasks), positionsOffset, fieldsOffset, cellCount)
+        os.replace(temporaryPath, path) #the corpus only appears once it is complete
+        for key in [key for key in FieldCorpus.loaded if key[0] == os.path.abspath(path)]: #the corpus it replaced can't be loaded again
+            del FieldCorpus.loaded[key]
+        return FieldCorpus.load(path)
+
+    def writeFields(file, results, positionsOffset, fieldsOffset, cellCount):
+        "Writes the (Field bytes, starting x, starting y) results of generateCorpusField to their places in a corpus file"
+        for i, (cells, x, y) in enumerate(results):
+            file.seek(positionsOffset + 8*i)
+            file.write(struct.pack("<ii", x, y))
+            file.seek(fieldsOffset + i*cellCount)
+            file.write(cells)
+
+
+class CorpusField(BufferField):
+    "A read-only Field stored in a FieldCorpus. Pickling sends only the corpus path and the Field index, and unpickling maps the same file."
+    def __init__(self, corpus, index):
+        "Constructor"
+        if index < 0 or index >= len(corpus):
+            raise IndexError("Field index out of range: " + str(index))
+        self.corpus = corpus #The FieldCorpus holding this Field
+        self.index = index #The index of this Field in the corpus
+        cellCount = corpus.width*corpus.height
+        offset = corpus.fieldsOffset + index*cellCount
+        BufferField.__init__(self, corpus.width, corpus.height, 0, memoryview(corpus.data)[offset:offset + cellCount])
+
+    def __reduce__(self):
+        "Pickles the CorpusField as its corpus path, corpus id and index"
+        return (FieldCorpus.loadField, (self.corpus.path, self.corpus.corpusId, self.index))
+
+
 class Pixel:
     "An object representing a pixel"
+    __slots__ = ("x", "y", "r", "g", "b")
     def __init__(self, x, y, r, g, b):
         "Constructor"
         self.x = x #x coordinate
@@ -776,9 +2377,9 @@ class EvolutionVisualizer:
         self.initialized = False
         
     def initialize(self):
+        importVisualizerModules()
         pygame.font.init()
         self.displayFont = pygame.font.SysFont(None, 30)
-        sys.setrecursionlimit(100000000)
         pygame.init()
         ctypes.windll.user32.SetProcessDPIAware()
         self.screenWidth = ctypes.windll.user32.GetSystemMetrics(0)
@@ -800,6 +2401,7 @@ class EvolutionVisualizer:
         #Begin evolution
         print("Starting evolution...")
         self.evolution = Evolution(self.populationSize)
+        self.evolution.applyCalibration()
         self.totalEvals = self.evolution.evalMovements * self.evolution.evalSample
         self.evolution.initializePopulation()
         self.individual = self.evolution.getBestIndividual().copyMachine()
@@ -826,7 +2428,7 @@ class EvolutionVisualizer:
                     self.screen.fill(self.background_colour)
                     #set each pixel
                     for p in self.pixelArray:
-                        self.screen.set_at((p[0],self.screenHeight-p[1]), (p[2],p[3],p[4]))
+                        self.screen.set_at((p.x,self.screenHeight-p.y), (p.r,p.g,p.b))
                     textsurface = self.displayFont.render(" Generation: "+str(self.genCount)+ "    Fitness: " + str(self.maxFitness), False, (255, 255, 255))
                     self.screen.blit(textsurface,(0,0))
                     pygame.display.flip()
@@ -885,12 +2487,12 @@ class EvolutionVisualizer:
             self.screen.fill(self.background_colour)
             #set each pixel
             for p in self.pixelArray:
-                self.screen.set_at((p[0],self.screenHeight-p[1]), (p[2],p[3],p[4]))
+                self.screen.set_at((p.x,self.screenHeight-p.y), (p.r,p.g,p.b))
             textsurface = self.displayFont.render(" Generation: "+str(self.genCount)+ "    Fitness: " + str(self.maxFitness), False, (255, 255, 255))
             self.screen.blit(textsurface,(0,0))
         elif (self.iteration % 20) == 0:
             for p in self.newPixels:
-                self.screen.set_at((p[0],self.screenHeight-p[1]), (p[2],p[3],p[4]))
+                self.screen.set_at((p.x,self.screenHeight-p.y), (p.r,p.g,p.b))
             self.newPixels = []
             prevStateText = self.displayFont.render("Current State: " + str(self.prevState), False, (0,0,0)) #hide previous state
             prevProgressText = self.displayFont.render("Progress: " + self.progressString, False, (0,0,0))
@@ -948,10 +2550,8 @@ class EvolutionVisualizer:
                 self.consecutiveBlocks = 0
                 coordinatesTravelled.add(self.position)
                 direction = self.individual.getNextValue()
-                self.pixelArray += [(self.position.x, self.position.y, 255, 255, 255)]
-                self.newPixels += [(self.position.x, self.position.y, 255, 255, 255)]
-                self.pixelArray += [(startPosition.x, startPosition.y, 0, 255, 0)]
-                self.newPixels += [(startPosition.x, startPosition.y, 0, 255, 0)]
+                self.addPixel(Pixel(self.position.x, self.position.y, 255, 255, 255))
+                self.addPixel(Pixel(startPosition.x, startPosition.y, 0, 255, 0))
         elif (self.iteration) > 0:
             print("Best Fitness: " + str(self.evolution.maxFitness))
             print(self.individual.toString())
@@ -983,12 +2583,17 @@ class EvolutionVisualizer:
         self.visualizerLocked = False
 
 
+    def addPixel(self, pixel):
+        "Adds the Pixel to pixelArray and to newPixels, so it is drawn on the next update and kept for redrawing the screen"
+        self.pixelArray.append(pixel)
+        self.newPixels.append(pixel)
+
     def createVisualizationField(self):
         "Creates the Field to be displayed in the visualizer"
         self.fieldRendered = False
         self.pixelArray = []
         self.newPixels = []
-        self.field = Field(self.screenWidth, self.screenHeight-40, 0)
+        self.field = NumpyField(self.screenWidth, self.screenHeight-40, 0) if numpy != None else Field(self.screenWidth, self.screenHeight-40, 0)
         obstacles = random.randint(1, 20)
         for s in range(0, obstacles):
             sides = random.randint(1, 5)
@@ -998,18 +2603,113 @@ class EvolutionVisualizer:
                 self.field.generateRandomShape(sides, random.randint(10, 300), Coordinate(random.randint(0, self.screenWidth-1), random.randint(0, self.screenHeight-41)), 1, 2)
         self.field.drawFieldBorder(1)
         self.position = self.field.getOpenCoordinate()
-        for x in range(0, self.field.width):
-            for y in range(0, self.field.height):
-                if self.field.grid[x][y] == 1:
-                    self.pixelArray += [(x, y, 0, 0, 255)]
-                    self.newPixels += [(x, y, 0, 0, 255)]
-                elif self.field.grid[x][y] == 2:
-                    self.pixelArray += [(x, y, 100, 100, 255)]
-                    self.newPixels += [(x, y, 100, 100, 255)]
-        
-
-def main():
-    "Initializes pygame and begins evolution and visualizer"
+        for x, y, value in self.field.getFilledCells():
+            if value == 1:
+                self.addPixel(Pixel(x, y, 0, 0, 255))
+            elif value == 2:
+                self.addPixel(Pixel(x, y, 100, 100, 255))
+        
+
+def parseArguments(arguments = None):
+    "Parses the command line arguments, or the given list of arguments"
+    parser = argparse.ArgumentParser(description="Evolves state machines that explore randomly generated Fields. Opens the visualizer unless --headless is given.")
+    parser.add_argument("--headless", action="store_true", help="train without the visualizer and print the best individual as JSON when done")
+    parser.add_argument("--generations", type=int, help="number of generations to run after the initial population in headless mode")
+    parser.add_argument("--time-budget", type=float, help="seconds to train for in headless mode. Training stops after the first generation that ends past the budget.")
+    parser.add_argument("--pop-size", type=int, default=200, help="number of individuals in each generation")
+    parser.add_argument("--eval-sample", type=int, help="number of Fields each individual is evaluated on per generation")
+    parser.add_argument("--eval-movements", type=int, help="number of movements in each evaluation")
+    parser.add_argument("--workers", type=int, help="number of worker processes. Defaults to the calibrated value for this host, or 4.")
+    parser.add_argument("--field-width", type=int, help="width of the evaluation Fields")
+    parser.add_argument("--field-height", type=int, help="height of the evaluation Fields")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--successive-halving", action="store_true", default=None, help="give only the fittest individuals all --eval-sample Fields and --eval-movements movements, in rounds that each keep the fittest half")
+    parser.add_argument("--steady-state", action="store_true", help="in headless mode, replace members of the population as soon as offspring are evaluated instead of evolving whole generations. Each reported generation is popSize offspring.")
+    parser.add_argument("--output", help="file to also write the best individual to")
+    parser.add_argument("--checkpoint", help="file to write checkpoints to in headless mode, every --checkpoint-interval generations and when training ends")
+    parser.add_argument("--checkpoint-interval", type=int, help="number of generations between checkpoints")
+    parser.add_argument("--remote-workers", help="comma separated host:port addresses of worker daemons to evaluate on instead of local worker processes")
+    parser.add_argument("--serve", metavar="HOST:PORT", help="run a worker daemon listening on the address instead of training. Use port 0 to pick a free port.")
+    parser.add_argument("--resume", help="checkpoint file to resume training from in headless mode. --generations then counts the generations after the checkpoint.")
+    options = parser.parse_args(arguments)
+    if options.headless and options.generations == None and options.time_budget == None:
+        parser.error("--headless needs --generations or --time-budget")
+    return options
+
+def createEvolutionFromOptions(options):
+    "Creates an Evolution with the settings given on the command line, or restores it from the --resume checkpoint. Settings that weren't given keep their defaults or checkpointed values."
+    if options.resume != None:
+        evolution = Evolution.loadCheckpoint(options.resume)
+    else:
+        evolution = Evolution(options.pop_size)
+    evolution.applyCalibration() #--workers overrides the calibrated worker count
+    settings = {"evalSample": options.eval_sample, "evalMovements": options.eval_movements, "threadCount": options.workers, "successiveHalving": options.successive_halving, "fieldWidth": options.field_width, "fieldHeight": options.field_height, "checkpointPath": options.checkpoint, "checkpointInterval": options.checkpoint_interval}
+    for attribute, value in settings.items():
+        if value != None:
+            setattr(evolution, attribute, value)
+    if options.remote_workers != None:
+        evolution.remoteWorkers = RemoteWorkerPool([address.strip() for address in options.remote_workers.split(",") if address.strip() != ""])
+    return evolution
+
+def trainHeadless(options, output = sys.stdout):
+    "Runs an Evolution with the given command line options for the given number of generations or time budget, printing the simulations and movements per second of each generation to stderr and the best individual as JSON to the output. Returns the Evolution."
+    if options.seed != None:
+        random.seed(options.seed) #a resumed run continues the random numbers saved in its checkpoint instead
+    evolution = createEvolutionFromOptions(options)
+    start = time.perf_counter()
+    startingGeneration = evolution.generation
+    initialized = options.resume != None
+    interrupted = False
+    try:
+        while True:
+            generationStart = time.perf_counter()
+            steps = evolution.stepsSimulated
+            simulated = evolution.individualsSimulated
+            if not initialized:
+                evolution.initializePopulation()
+                initialized = True
+            elif options.steady_state:
+                evolution.runSteadyState(evolution.popSize)
+            else:
+                evolution.nextGeneration()
+            elapsed = max(time.perf_counter() - generationStart, 1e-9)
+            evaluations = evolution.popSize*evolution.evalSample #successive halving, stored fitnesses and the fitnessCache leave some of them unsimulated
+            simulated = evolution.individualsSimulated - simulated
+            print("generation " + str(evolution.generation) + ": max fitness " + str(evolution.maxFitness) + ", " + str(round(elapsed, 3)) + " s, " + str(round(simulated / elapsed, 1)) + " simulations/s (" + str(simulated) + " of " + str(evaluations) + " evaluations simulated), " + str(round((evolution.stepsSimulated - steps) / elapsed)) + " steps/s", file=sys.stderr, flush=True)
+            if options.generations != None and evolution.generation - startingGeneration >= options.generations:
+                break
+            if options.time_budget != None and time.perf_counter() - start >= options.time_budget:
+                break
+    except KeyboardInterrupt: #stop early, but still report the best individual so far
+        interrupted = True
+    finally:
+        evolution.shutdownWorkerPool()
+        evolution.waitForCheckpoint()
+    if evolution.checkpointPath != None and initialized and not interrupted: #an interrupted generation may be half done, so keep the last complete checkpoint
+        evolution.saveCheckpoint(evolution.checkpointPath)
+    if evolution.bestIndividual != None:
+        serialized = evolution.bestIndividual.toJson()
+        print(serialized, file=output)
+        if options.output != None:
+            with open(options.output, "w") as file:
+                file.write(serialized + "\n")
+    return evolution
+
+def main(arguments = None):
+    "Runs a worker daemon if --serve is given, trains headless if --headless is given, otherwise initializes pygame and begins evolution and visualizer"
+    options = parseArguments(arguments)
+    if options.serve != None:
+        host, port = options.serve.rsplit(":", 1)
+        daemon = WorkerDaemon(host, int(port))
+        print("Worker daemon listening on " + daemon.address[0] + ":" + str(daemon.address[1]), flush=True)
+        try:
+            daemon.serveForever()
+        except KeyboardInterrupt:
+            daemon.stop()
+        return
+    if options.headless:
+        trainHeadless(options)
+        return
     print("Welcome to ExplorerEvolution! Please be patient while the starting population is generated.")
     visualizer = EvolutionVisualizer()
     visualizer.initialize()
@@ -1017,6 +2717,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-    
-
-
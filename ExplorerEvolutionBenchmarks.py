@@ -0,0 +1,388 @@
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+import os
+import tempfile
+import subprocess
+from ExplorerEvolution import Evolution
+from ExplorerEvolution import IslandModel
+from ExplorerEvolution import RemoteWorkerPool
+from ExplorerEvolution import StateMachine
+from ExplorerEvolution import State
+from ExplorerEvolution import Pixel
+from ExplorerEvolution import Field
+
+def timeGenerations(evolution, generations):
+    "Runs the given number of generations on an initialized Evolution and returns the generations per second"
+    start = time.perf_counter()
+    for i in range(generations):
+        evolution.nextGeneration()
+    return generations / (time.perf_counter() - start)
+
+def benchmarkWorkerPool(popSize = 200, evalSample = 10, generations = 3, threadCount = 4):
+    "Compares generations per second of the legacy simulateOnField path, which starts threadCount processes for every sample Field and collects their results from fitnessQueue, against reusing a persistent worker pool. Both dispatch one Field at a time with the fitness cache and shared memory Fields off, so only the worker handling differs. Other optimizations, such as compiled transition tables, speed up both, so neither case is the baseline code."
+    for persistentWorkers in (False, True):
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = threadCount
+        evolution.persistentWorkers = persistentWorkers
+        evolution.batchedSamples = False
+        evolution.sharedFieldMemory = False
+        evolution.fitnessCache = None
+        evolution.initializePopulation()
+        rate = timeGenerations(evolution, generations)
+        evolution.shutdownWorkerPool()
+        name = "persistent worker pool" if persistentWorkers else "processes started per sample (simulateOnField, fitnessQueue)"
+        print(name + ": " + str(round(rate, 3)) + " generations/s")
+
+def benchmarkBatchedSamples(popSize = 200, evalSample = 10, generations = 3, threadCount = 4):
+    "Compares generations per second when dispatching every sample Field to the worker pool separately and when dispatching all of them at once"
+    for batchedSamples in (False, True):
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = threadCount
+        evolution.batchedSamples = batchedSamples
+        evolution.initializePopulation()
+        rate = timeGenerations(evolution, generations)
+        evolution.shutdownWorkerPool()
+        print("batchedSamples=" + str(batchedSamples) + ": " + str(round(rate, 3)) + " generations/s")
+
+def benchmarkWorkUnitSize(popSize = 200, evalSample = 10, generations = 3, threadCount = 4, sizes = (0, 50, 20, 5, 1)):
+    "Compares generations per second and worker utilization for different worker pool task sizes. Size 0 gives each worker one equal chunk of every Field."
+    for workUnitSize in sizes:
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = threadCount
+        evolution.workUnitSize = workUnitSize
+        evolution.initializePopulation()
+        evolution.workerBusyTime.clear()
+        evolution.workerIdleTime.clear()
+        rate = timeGenerations(evolution, generations)
+        evolution.shutdownWorkerPool()
+        print("workUnitSize=" + str(workUnitSize) + ": " + str(round(rate, 3)) + " generations/s, " + str(round(evolution.getWorkerUtilization()*100, 1)) + "% worker utilization")
+
+def benchmarkSteadyState(popSize = 200, evalSample = 10, generations = 3, threadCount = 4):
+    "Compares fitness evaluations per second and the best fitness reached between generational and steady-state evolution for the same number of offspring"
+    for steadyState in (False, True):
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = threadCount
+        evolution.initializePopulation()
+        simulated = evolution.individualsSimulated
+        start = time.perf_counter()
+        if steadyState:
+            evolution.runSteadyState(popSize*generations)
+        else:
+            for i in range(generations):
+                evolution.nextGeneration()
+        elapsed = time.perf_counter() - start
+        evolution.shutdownWorkerPool()
+        print("steadyState=" + str(steadyState) + ": " + str(round((evolution.individualsSimulated - simulated) / elapsed, 1)) + " simulations/s, max fitness " + str(evolution.maxFitness))
+
+def benchmarkIslandModel(popSize = 100, evalSample = 10, generations = 5, islandCounts = (1, 2, 4)):
+    "Compares total simulations per second and the best fitness reached for different numbers of islands, each with its own process and popSize individuals, migrating around a ring every generation"
+    for islandCount in islandCounts:
+        model = IslandModel(islandCount, popSize)
+        model.migrationInterval = 1
+        model.settings = {"evalSample": evalSample}
+        start = time.perf_counter()
+        model.run(generations, seed=0)
+        elapsed = time.perf_counter() - start
+        simulated = sum(result[3] for result in model.islandResults)
+        print("islands=" + str(islandCount) + ": " + str(round(simulated / elapsed, 1)) + " simulations/s, max fitness " + str(model.maxFitness))
+
+def benchmarkRemoteWorkers(popSize = 200, evalSample = 10, generations = 3, workerCount = 4):
+    "Compares generations per second with a local worker pool and with the same number of worker daemons on localhost, each in its own process"
+    directory = os.path.dirname(os.path.abspath(__file__))
+    daemons = [subprocess.Popen([sys.executable, "ExplorerEvolution.py", "--serve", "127.0.0.1:0"], stdout=subprocess.PIPE, text=True, cwd=directory) for i in range(workerCount)]
+    try:
+        addresses = [daemon.stdout.readline().split()[-1] for daemon in daemons]
+        for remote in (False, True):
+            random.seed(0)
+            evolution = Evolution(popSize)
+            evolution.evalSample = evalSample
+            evolution.threadCount = workerCount
+            if remote:
+                evolution.remoteWorkers = RemoteWorkerPool(addresses)
+            evolution.initializePopulation()
+            rate = timeGenerations(evolution, generations)
+            evolution.shutdownWorkerPool()
+            print("remote=" + str(remote) + ": " + str(round(rate, 3)) + " generations/s")
+    finally:
+        for daemon in daemons:
+            daemon.terminate()
+            daemon.wait()
+
+def scoreOnTestFields(individual, count = 20, seed = 1):
+    "Returns the total fitness of the individual on count Fields generated from the given seed, without changing the random number generator state"
+    randomState = random.getstate()
+    random.seed(seed)
+    evaluator = Evolution(0)
+    evaluator.threadCount = 1
+    evaluator.fitnessCache = None
+    score = 0
+    for i in range(count):
+        evaluator.generateField()
+        score += evaluator.evaluateFitness(individual)
+    random.setstate(randomState)
+    return score
+
+def benchmarkSuccessiveHalving(popSize = 200, evalSample = 10, generations = 10, threadCount = 1):
+    "Compares movements simulated per generation and the best individual's total fitness on 20 held-out Fields between the fixed evaluation budget and successive halving, then runs successive halving until it matches the fixed budget's held-out fitness"
+    results = {}
+    for successiveHalving in (False, True):
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = threadCount
+        evolution.successiveHalving = successiveHalving
+        evolution.initializePopulation()
+        steps = evolution.stepsSimulated
+        for i in range(generations):
+            evolution.nextGeneration()
+        score = scoreOnTestFields(evolution.bestIndividual)
+        results[successiveHalving] = (evolution, score, evolution.stepsSimulated - steps)
+        print("successiveHalving=" + str(successiveHalving) + ": " + str(round((evolution.stepsSimulated - steps) / generations)) + " steps/generation, held-out fitness " + str(score))
+    fixedEvolution, target, fixedSteps = results[False]
+    evolution, score, steps = results[True]
+    extraGenerations = 0
+    while score < target and extraGenerations < 2*generations:
+        stepsBefore = evolution.stepsSimulated
+        evolution.nextGeneration()
+        steps += evolution.stepsSimulated - stepsBefore
+        extraGenerations += 1
+        score = scoreOnTestFields(evolution.bestIndividual)
+    evolution.shutdownWorkerPool()
+    fixedEvolution.shutdownWorkerPool()
+    print("successive halving reached held-out fitness " + str(score) + " (target " + str(target) + ") after " + str(generations + extraGenerations) + " generations and " + str(steps) + " steps, " + str(round(100*(1 - steps/fixedSteps), 1)) + "% fewer than the fixed budget")
+
+def benchmarkFixedFields(popSize = 200, evalSample = 10, generations = 3, mutationRates = (0.1, 0.02)):
+    "Compares simulations per generation and generations per second with new Fields every generation and with a fixed set of evalSample Fields, where unchanged individuals reuse their stored fitnesses. The fitness cache is disabled, so only stored fitnesses are reused."
+    for mutationRate in mutationRates:
+        for fixedFieldCount in (0, evalSample):
+            random.seed(0)
+            evolution = Evolution(popSize)
+            evolution.evalSample = evalSample
+            evolution.threadCount = 1
+            evolution.mutationRate = mutationRate
+            evolution.fitnessCache = None
+            evolution.fixedFieldCount = fixedFieldCount
+            evolution.initializePopulation()
+            simulated = evolution.individualsSimulated
+            reused = evolution.fitnessesReused
+            rate = timeGenerations(evolution, generations)
+            print("mutationRate=" + str(mutationRate) + ", fixedFieldCount=" + str(fixedFieldCount) + ": " + str(round((evolution.individualsSimulated - simulated) / generations)) + " simulations/generation, " + str(round((evolution.fitnessesReused - reused) / generations)) + " fitnesses reused/generation, " + str(round(rate, 3)) + " generations/s")
+
+def benchmarkFieldTransfer(samples = 10):
+    "Compares the bytes pickled to send one worker its evaluation settings and Field with and without shared memory Fields"
+    for sharedFieldMemory in (False, True):
+        random.seed(0)
+        evolution = Evolution(0)
+        evolution.sharedFieldMemory = sharedFieldMemory
+        size = 0
+        start = time.perf_counter()
+        for i in range(samples):
+            evolution.generateField()
+            size += len(pickle.dumps(evolution.getEvaluator()))
+        elapsed = time.perf_counter() - start
+        print("sharedFieldMemory=" + str(sharedFieldMemory) + ": " + str(size // samples) + " bytes per worker per sample, " + str(round(elapsed / samples * 1000, 1)) + " ms per sample")
+
+def benchmarkEvaluateFitness(individuals = 200, repeats = 5):
+    "Measures the average time of a single evaluateFitness call on one Field, with and without the blocked shortcut and cycle detection"
+    random.seed(0)
+    evolution = Evolution(0)
+    evolution.threadCount = 1
+    evolution.generateField()
+    population = [evolution.generateRandomIndividual() for i in range(individuals)]
+    for evaluationBlockedShortcut in (True, False):
+        for cycleDetection in (False, True):
+            evolution.evaluationBlockedShortcut = evaluationBlockedShortcut
+            evolution.cycleDetection = cycleDetection
+            start = time.perf_counter()
+            for r in range(repeats):
+                for individual in population:
+                    evolution.evaluateFitness(individual)
+            elapsed = time.perf_counter() - start
+            print("evaluationBlockedShortcut=" + str(evaluationBlockedShortcut) + ", cycleDetection=" + str(cycleDetection) + ": " + str(round(elapsed / (individuals * repeats) * 1000000, 1)) + " us per evaluateFitness call")
+
+def benchmarkSimulator(individuals = 200, samples = 3):
+    "Compares evaluating a whole population on one Field at a time with the python and numpy simulators"
+    random.seed(0)
+    evolution = Evolution(0)
+    evolution.threadCount = 1
+    population = [evolution.generateRandomIndividual() for i in range(individuals)]
+    fields = []
+    for i in range(samples):
+        evolution.generateField()
+        fields.append((evolution.field, evolution.startingPosition))
+    for simulator in ("python", "numpy"):
+        evolution.simulator = simulator
+        start = time.perf_counter()
+        for evolution.field, evolution.startingPosition in fields:
+            evolution.evaluateIndividuals(population)
+        elapsed = time.perf_counter() - start
+        print("simulator=" + simulator + ": " + str(round(elapsed / samples * 1000, 1)) + " ms per population per Field")
+
+def benchmarkFitnessCache(popSize = 200, evalSample = 10, generations = 3):
+    "Compares generations per second with and without the fitness cache, and reports how many individuals were simulated"
+    for cached in (False, True):
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.evalSample = evalSample
+        evolution.threadCount = 1
+        if not cached:
+            evolution.fitnessCache = None
+        evolution.initializePopulation()
+        rate = timeGenerations(evolution, generations)
+        message = "fitnessCache=" + str(cached) + ": " + str(round(rate, 3)) + " generations/s"
+        print(message + ", " + str(evolution.individualsSimulated) + " individuals simulated")
+
+def benchmarkPurgeIslands(sizes = (1000, 10000, 100000), repeats = 5):
+    "Measures purgeIslands on random machines with thousands of States, half of them reachable only through a long chain"
+    random.seed(0)
+    for size in sizes:
+        elapsed = 0
+        for r in range(repeats):
+            statesDict = {}
+            for i in range(size):
+                if i < size // 2: #a chain as deep as half the machine
+                    statesDict[i] = State(i + 1, random.randint(0, i), random.randint(0, i), random.choice((-1, random.randint(0, 100))), random.randint(1, State.values), i)
+                else:
+                    statesDict[i] = State(random.randint(0, size - 1), random.randint(0, size - 1), random.randint(0, size - 1), random.choice((-1, random.randint(0, 100))), random.randint(1, State.values), i)
+            stateMachine = StateMachine(statesDict)
+            start = time.perf_counter()
+            stateMachine.purgeIslands()
+            elapsed += time.perf_counter() - start
+        print(str(size) + " States: " + str(round(elapsed / repeats * 1000, 2)) + " ms per purgeIslands call")
+
+def measureAllocation(function):
+    "Calls the function and returns its result and the number of bytes it allocated that are still in use"
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, allocated
+
+class DictState:
+    "A State without __slots__, holding the same attributes in a per-instance __dict__ like State did before it declared __slots__"
+    def __init__(self, nextState, blockedState, breakState, breakAfter, value, identifier):
+        "Constructor"
+        self.nextState = nextState
+        self.blockedState = blockedState
+        self.value = value
+        self.identifier = identifier
+        self.breakState = breakState
+        self.breakAfter = breakAfter
+        self.hitCount = 0
+
+def benchmarkMemory(popSize = 200, screenWidth = 1920, screenHeight = 1080):
+    "Compares the memory used by the same random population with States that have a per-instance __dict__ and with slotted States, reports the memory its compiled transition tables add, and compares the visualizer's obstacle pixels for a full-screen Field as Pixels and as the two tuples per pixel used before"
+    random.seed(0)
+    evolution = Evolution(popSize)
+    population = [evolution.generateRandomIndividual() for i in range(popSize)]
+    stateCount = sum(len(individual.statesDict) for individual in population)
+    for stateClass in (DictState, State):
+        machines, allocated = measureAllocation(lambda: [StateMachine({key: stateClass(s.nextState, s.blockedState, s.breakState, s.breakAfter, s.value, s.identifier) for key, s in individual.statesDict.items()}) for individual in population])
+        print("population of " + str(popSize) + " with " + stateClass.__name__ + "s: " + str(allocated // 1024) + " KiB, " + str(allocated // stateCount) + " bytes per State")
+    compiled, compiledBytes = measureAllocation(lambda: [individual.getCompiled() for individual in population])
+    print("compiled transition tables: " + str(compiledBytes // 1024) + " KiB more, " + str(compiledBytes // stateCount) + " bytes per State")
+    evolution.fieldWidth = screenWidth
+    evolution.fieldHeight = screenHeight - 40
+    evolution.generateField()
+    field = evolution.field
+    cells = [(x, y, field.grid[x][y]) for x in range(field.width) for y in range(field.height) if field.grid[x][y] != 0]
+    pixels, pixelBytes = measureAllocation(lambda: [Pixel(x, y, 0, 0, 255) for x, y, value in cells])
+    tuples, tupleBytes = measureAllocation(lambda: ([(x, y, 0, 0, 255) for x, y, value in cells], [(x, y, 0, 0, 255) for x, y, value in cells]))
+    print("visualizer Field with " + str(len(cells)) + " obstacle pixels: " + str(pixelBytes // 1024) + " KiB as Pixels, " + str(tupleBytes // 1024) + " KiB as two tuples per pixel")
+
+def benchmarkFieldGeneration(samples = 20, screenWidth = 1920, screenHeight = 1080):
+    "Compares generating evaluation Fields and full-screen visualizer Fields as list Fields and as NumpyFields, with circle obstacles only and with polygon obstacles"
+    for size in ((240, 135), (screenWidth, screenHeight - 40)):
+        for maxSides in (2, 8):
+            for useNumpy in (False, True):
+                random.seed(0)
+                evolution = Evolution(0)
+                evolution.threadCount = 1
+                evolution.fieldWidth, evolution.fieldHeight = size
+                evolution.fieldObstacleMaxSides = maxSides
+                if not useNumpy:
+                    evolution.createField = lambda: Field(evolution.fieldWidth, evolution.fieldHeight, 0)
+                start = time.perf_counter()
+                for i in range(samples):
+                    evolution.generateField()
+                elapsed = time.perf_counter() - start
+                print(str(size[0]) + "x" + str(size[1]) + ", fieldObstacleMaxSides=" + str(maxSides) + ", numpy=" + str(useNumpy) + ": " + str(round(elapsed / samples * 1000, 2)) + " ms per generateField call")
+
+def benchmarkFieldCorpus(popSize = 200, evalSample = 10, generations = 3, corpusSize = 100, threadCount = 4):
+    "Measures creating a field corpus, then compares generations per second when generating Fields for every sample and when drawing them from the corpus"
+    with tempfile.TemporaryDirectory() as directory:
+        random.seed(0)
+        evolution = Evolution(popSize)
+        evolution.threadCount = threadCount
+        start = time.perf_counter()
+        corpus = evolution.createFieldCorpus(os.path.join(directory, "fields.corpus"), corpusSize, seed=0)
+        elapsed = time.perf_counter() - start
+        print("created " + str(corpusSize) + " Fields in " + str(round(elapsed, 2)) + " s, " + str(os.path.getsize(corpus.path) // 1024) + " KiB")
+        for useCorpus in (False, True):
+            random.seed(0)
+            evolution = Evolution(popSize)
+            evolution.evalSample = evalSample
+            evolution.threadCount = threadCount
+            if useCorpus:
+                evolution.fieldCorpus = corpus
+            evolution.initializePopulation()
+            rate = timeGenerations(evolution, generations)
+            evolution.shutdownWorkerPool()
+            print("fieldCorpus=" + str(useCorpus) + ": " + str(round(rate, 3)) + " generations/s, " + str(evolution.individualsSimulated) + " individuals simulated")
+
+def benchmarkImportTime(repeats = 5):
+    "Measures how long a fresh interpreter takes to import ExplorerEvolution and create an Evolution, and to import pygame on its own for comparison"
+    directory = os.path.dirname(os.path.abspath(__file__))
+    scripts = (("import ExplorerEvolution; ExplorerEvolution.Evolution(0)", "import ExplorerEvolution"), ("import pygame", "import pygame"))
+    for script, name in scripts:
+        timer = "import time; start = time.perf_counter(); " + script + "; print(time.perf_counter() - start)"
+        elapsed = 0
+        for r in range(repeats):
+            result = subprocess.run([sys.executable, "-c", timer], capture_output=True, text=True, cwd=directory, env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1"))
+            if result.returncode != 0:
+                print(name + ": failed")
+                break
+            elapsed += float(result.stdout.split()[-1])
+        else:
+            print(name + ": " + str(round(elapsed / repeats * 1000, 1)) + " ms")
+
+def benchmarkCheckpoint(popSize = 200, repeats = 5):
+    "Measures the size of a checkpoint of a random population and the time taken to create and restore it, compared with pickling the population"
+    random.seed(0)
+    evolution = Evolution(popSize)
+    evolution.population = [evolution.generateRandomIndividual() for i in range(popSize)]
+    evolution.popFitness = [0]*popSize
+    start = time.perf_counter()
+    for r in range(repeats):
+        data = evolution.toCheckpoint()
+    created = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for r in range(repeats):
+        Evolution.fromCheckpoint(data)
+    restored = (time.perf_counter() - start) / repeats
+    pickled = len(pickle.dumps(evolution.population))
+    print("checkpoint of " + str(popSize) + " individuals: " + str(len(data) // 1024) + " KiB (pickled population: " + str(pickled // 1024) + " KiB), " + str(round(created * 1000, 1)) + " ms to create, " + str(round(restored * 1000, 1)) + " ms to restore")
+
+benchmarks = {"workerPool": benchmarkWorkerPool, "batchedSamples": benchmarkBatchedSamples, "workUnitSize": benchmarkWorkUnitSize, "steadyState": benchmarkSteadyState, "successiveHalving": benchmarkSuccessiveHalving, "islandModel": benchmarkIslandModel, "remoteWorkers": benchmarkRemoteWorkers, "fieldTransfer": benchmarkFieldTransfer, "evaluateFitness": benchmarkEvaluateFitness, "simulator": benchmarkSimulator, "fitnessCache": benchmarkFitnessCache, "fixedFields": benchmarkFixedFields, "purgeIslands": benchmarkPurgeIslands, "memory": benchmarkMemory, "fieldGeneration": benchmarkFieldGeneration, "fieldCorpus": benchmarkFieldCorpus, "importTime": benchmarkImportTime, "checkpoint": benchmarkCheckpoint}
+
+def main():
+    "Runs the benchmarks named on the command line, or all benchmarks if none are named"
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(benchmarks.keys())
+    for name in names:
+        print("== " + name + " ==")
+        benchmarks[name]()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,91 @@
 import unittest
+import random
 from ExplorerEvolution import StateMachine
 from ExplorerEvolution import State
+from ExplorerEvolution import Evolution
+from ExplorerEvolution import Field
+from ExplorerEvolution import SharedField
+from ExplorerEvolution import NumpyField
+from ExplorerEvolution import FieldCorpus
+from ExplorerEvolution import parseArguments
+from ExplorerEvolution import trainHeadless
+from ExplorerEvolution import createEvolutionFromOptions
+from ExplorerEvolution import evaluateOffspringTask
+from ExplorerEvolution import evaluateWorkerTasks
+from ExplorerEvolution import IslandModel
+from ExplorerEvolution import WorkerDaemon
+from ExplorerEvolution import RemoteWorkerPool
+from ExplorerEvolution import Coordinate
+from ExplorerEvolution import numpy
+from ExplorerEvolution import FitnessCache
+import pickle
+import os
+import tempfile
+import subprocess
+import sys
+import io
+import contextlib
+import socket
+import threading
+
+def createSmallEvolution(popSize = 12):
+    "Creates an Evolution with a small field and a short evaluation so tests run quickly"
+    evolution = Evolution(popSize)
+    evolution.fieldWidth = 240
+    evolution.fieldHeight = 135
+    evolution.evalMovements = 300
+    evolution.evalSample = 2
+    evolution.threadCount = 2
+    return evolution
+
+def referenceFitness(evolution, individual):
+    "Evaluates fitness by stepping the StateMachine itself and counting the unique coordinates it travels to"
+    moves = {1: (0, 1), 2: (1, 1), 3: (1, 0), 4: (1, -1), 5: (0, -1), 6: (-1, -1), 7: (-1, 0), 8: (-1, 1)}
+    coordinatesTravelled = set()
+    x, y = evolution.startingPosition.x, evolution.startingPosition.y
+    individual.currentState = 0
+    individual.resetStates()
+    direction = individual.getCurrentValue()
+    consecutiveBlocks = 0
+    for i in range(evolution.evalMovements):
+        newX, newY = x + moves[direction][0], y + moves[direction][1]
+        if evolution.field.getValueAtCoordinate(Coordinate(newX, newY)) != 0:
+            consecutiveBlocks += 1
+            if evolution.evaluationBlockedShortcut and consecutiveBlocks > len(individual.statesDict):
+                break
+            direction = individual.getBlockedValue()
+        else:
+            consecutiveBlocks = 0
+            x, y = newX, newY
+            coordinatesTravelled.add((x, y))
+            direction = individual.getNextValue()
+    return len(coordinatesTravelled)
+
+def runSmallEvolution(seed, step = Evolution.initializePopulation, **settings):
+    "Seeds the random number generator, creates a small Evolution with the given attribute settings and calls step with it, shutting down its worker pool afterwards. Returns the Evolution."
+    random.seed(seed)
+    evolution = createSmallEvolution()
+    for attribute, value in settings.items():
+        setattr(evolution, attribute, value)
+    try:
+        step(evolution)
+    finally:
+        evolution.shutdownWorkerPool()
+    return evolution
+
+def runGeneration(evolution):
+    "Creates the initial population of the Evolution and runs one generation"
+    evolution.initializePopulation()
+    evolution.nextGeneration()
+
+def exitIsland():
+    "Replaces nextGeneration on an island that should exit at once, as if its process was killed"
+    os._exit(1)
+
+def createEvaluatedSamples(seed, count = 20, **settings):
+    "Returns an Evolution with a generated Field and a list of random individuals"
+    evolution = runSmallEvolution(seed, Evolution.generateField, **dict({"threadCount": 1}, **settings))
+    return evolution, [evolution.mutate(evolution.generateRandomIndividual()) for i in range(count)]
 
 class TestStateMachineMethods(unittest.TestCase):
 
@@ -244,6 +329,29 @@ class TestStateMachineMethods(unittest.TestCase):
         self.assertEqual(stateMachine.statesDict[3], statesDict[3])
         self.assertEqual(stateMachine.statesDict[4], statesDict[4])
 
+    def test_purgeIslands_updates_available_ids(self):
+        statesDict = {}
+        statesDict[0] = State(2, 2, 0, 1, 1, 0)
+        statesDict[1] = State(0, 0, 0, 1, 1, 1) #unreachable
+        statesDict[2] = State(0, 0, 0, 1, 1, 2)
+        statesDict[3] = State(1, 1, 0, 1, 1, 3) #unreachable
+        stateMachine = StateMachine(statesDict)
+        stateMachine.purgeIslands()
+        self.assertEqual(stateMachine.highestId, 2)
+        self.assertEqual(stateMachine.removedStateIds, [1])
+        self.assertEqual(stateMachine.getNewId(), 1)
+        self.assertEqual(stateMachine.getNewId(), 3)
+
+    def test_purgeIslands_with_long_chain(self):
+        statesDict = {}
+        for i in range(100000):
+            statesDict[i] = State(i+1, i, i, -1, 1, i)
+        statesDict[100000] = State(0, 0, 0, -1, 1, 100000)
+        statesDict[100001] = State(0, 0, 0, -1, 1, 100001) #unreachable
+        stateMachine = StateMachine(statesDict)
+        stateMachine.purgeIslands()
+        self.assertEqual(len(stateMachine.statesDict), 100001)
+
     def test_recursiveGroom_with_unreachable_states(self):
         statesDict = {}
         #reachable
@@ -480,6 +588,112 @@ class TestStateMachineMethods(unittest.TestCase):
         stateMachine1 = StateMachine(statesDict)
         self.assertEqual(hash(stateMachine1), hash(stateMachine1))
     
+    def test_toBytes_round_trip(self):
+        random.seed(5)
+        machine = Evolution(0).generateRandomIndividual()
+        machine.removeState(max(machine.statesDict.keys()))
+        data = machine.toBytes()
+        self.assertEqual(len(data), 12 + State.byteSize*len(machine.statesDict) + 4*len(machine.removedStateIds))
+        copy = StateMachine.fromBytes(data)
+        self.assertEqual(copy, machine)
+        self.assertEqual(copy.removedStateIds, machine.removedStateIds)
+        self.assertEqual(copy.highestId, machine.highestId)
+
+    def test_toJson_round_trip(self):
+        random.seed(3)
+        machine = Evolution(0).generateRandomIndividual()
+        machine.removeState(max(machine.statesDict.keys()))
+        copy = StateMachine.fromJson(machine.toJson())
+        self.assertEqual(copy, machine)
+        self.assertEqual(copy.removedStateIds, machine.removedStateIds)
+        self.assertEqual(copy.highestId, machine.highestId)
+
+    def test_getCompiled_remaps_reachable_states(self):
+        statesDict = {}
+        statesDict[0] = State(4, 9, 0, 3, 1, 0)
+        statesDict[2] = State(2, 0, 4, -1, 2, 2)
+        statesDict[4] = State(0, 4, 2, 10, 3, 4)
+        statesDict[7] = State(7, 7, 7, -1, 4, 7)
+        stateMachine = StateMachine(statesDict)
+        compiled = stateMachine.getCompiled()
+        self.assertEqual(compiled.stateIds, [0, 4, 2])
+        self.assertEqual(list(compiled.nextStates), [1, 0, 2])
+        self.assertEqual(list(compiled.blockedStates), [0, 1, 0])
+        self.assertEqual(list(compiled.breakStates), [0, 2, 0]) #State 2 never breaks
+        self.assertEqual(list(compiled.breakAfters), [3, 10, -1])
+        self.assertEqual(list(compiled.values), [1, 3, 2])
+        self.assertEqual(compiled.stateCount, 4)
+        self.assertIs(stateMachine.getCompiled(), compiled)
+
+    def test_fingerprint_ignores_identifiers_and_unreachable_states(self):
+        statesDict = {}
+        statesDict[0] = State(1, 2, 0, -1, 1, 0)
+        statesDict[1] = State(2, 0, 3, 5, 2, 1)
+        statesDict[2] = State(0, 1, 1, 1, 3, 2)
+        statesDict[3] = State(3, 3, 3, -1, 4, 3)
+        statesDict2 = {}
+        statesDict2[0] = State(5, 7, 7, -1, 1, 0)
+        statesDict2[5] = State(7, 0, 8, 5, 2, 5)
+        statesDict2[7] = State(9, 5, 5, 0, 3, 7) #next and blocked are never taken since it always breaks
+        statesDict2[8] = State(8, 8, 8, -1, 4, 8)
+        statesDict2[4] = State(4, 4, 4, -1, 6, 4) #unreachable
+        fingerprint = StateMachine(statesDict).getCompiled().fingerprint
+        self.assertEqual(StateMachine(statesDict2).getCompiled().fingerprint, fingerprint)
+        statesDict2[8].value = 5
+        self.assertNotEqual(StateMachine(statesDict2).getCompiled().fingerprint, fingerprint)
+
+    def test_canonicalize_merges_equivalent_states(self):
+        statesDict = {}
+        statesDict[0] = State(4, 2, 0, -1, 3, 0)
+        statesDict[2] = State(0, 4, 0, -1, 5, 2)
+        statesDict[4] = State(0, 2, 3, -1, 5, 4)
+        statesDict[3] = State(3, 3, 3, -1, 1, 3) #unreachable
+        stateMachine = StateMachine(statesDict)
+        stateMachine.removedStateIds = [1]
+        stateMachine.canonicalize()
+        self.assertEqual(stateMachine.statesDict, {0: State(1, 1, 0, -1, 3, 0), 1: State(0, 1, 0, -1, 5, 1)})
+        self.assertEqual(stateMachine.removedStateIds, [])
+        self.assertEqual(stateMachine.highestId, 1)
+
+    def test_canonicalize_keeps_states_counting_hits_apart(self):
+        statesDict = {}
+        statesDict[0] = State(1, 2, 0, -1, 3, 0)
+        statesDict[1] = State(0, 0, 0, 4, 5, 1)
+        statesDict[2] = State(0, 0, 0, 4, 5, 2)
+        stateMachine = StateMachine(statesDict)
+        stateMachine.canonicalize()
+        self.assertEqual(len(stateMachine.statesDict), 3)
+
+    def test_canonicalize_preserves_fitness(self):
+        evolution, individuals = createEvaluatedSamples(7, count=40, evaluationBlockedShortcut=False)
+        for individual in individuals:
+            fitness = evolution.evaluateFitness(individual)
+            individual.canonicalize()
+            self.assertEqual(evolution.evaluateFitness(individual), fitness)
+            self.assertEqual(sorted(individual.statesDict.keys()), list(range(len(individual.statesDict))))
+
+    def test_replaceOrAddState_invalidates_compiled(self):
+        statesDict = {}
+        for i in range(3):
+            statesDict[i] = State(0, 0, 0, 0, 1, i)
+        stateMachine = StateMachine(statesDict)
+        stateMachine.getCompiled()
+        stateMachine.replaceOrAddState(State(1, 1, 1, 1, 1, 1))
+        self.assertIsNone(stateMachine.compiled)
+
+    def test_fieldFitness_kept_by_copies_and_cleared_by_changes(self):
+        statesDict = {}
+        for i in range(3):
+            statesDict[i] = State(1, 2, 0, -1, 1, i)
+        stateMachine = StateMachine(statesDict)
+        stateMachine.fieldFitness[("key",)] = 10
+        self.assertEqual(stateMachine.copyMachine().fieldFitness, {("key",): 10})
+        self.assertEqual(pickle.loads(pickle.dumps(stateMachine)).fieldFitness, {})
+        stateMachine.replaceOrAddState(State(1, 2, 0, -1, 1, 1))
+        self.assertEqual(stateMachine.fieldFitness, {("key",): 10})
+        stateMachine.replaceOrAddState(State(1, 1, 1, 1, 1, 1))
+        self.assertEqual(stateMachine.fieldFitness, {})
+    
 
 class TestStateMethods(unittest.TestCase):
 
@@ -515,6 +729,10 @@ class TestStateMethods(unittest.TestCase):
         state1 = State(0, 1, 2, 3, 5, 0)
         self.assertEqual(state1.toString(), "[down, next: 0, blocked: 1, break: 2, break after: 3, ID: 0]")
 
+    def test_toBytes_round_trip(self):
+        state = State(3, 70000, 2, -1, 8, 12)
+        self.assertEqual(State.fromBytes(b"ab" + state.toBytes(), 2), state)
+
     def test_copyState_members(self):
         state1 = State(0, 1, 2, 3, 5, 0)
         state2 = state1.copyState()
@@ -537,5 +755,763 @@ class TestStateMethods(unittest.TestCase):
         self.assertEqual(State.valueDictionary[8], "up-left")
 
 
+class TestEvolutionMethods(unittest.TestCase):
+
+    budgetSettings = {"popSize": 20, "threadCount": 1, "evalSample": 4, "fitnessCache": None} #every individual is simulated, so evaluation budgets can be compared
+
+    def test_fixedFieldCount_cycles_through_fields(self):
+        evolution = runSmallEvolution(3, Evolution.generateField, threadCount=1, fixedFieldCount=2)
+        fieldIds = [evolution.fieldId]
+        for i in range(4):
+            evolution.generateField()
+            fieldIds.append(evolution.fieldId)
+        self.assertEqual(fieldIds, [1, 2, 1, 2, 1])
+        self.assertEqual(evolution.fieldsGenerated, 2)
+
+    def test_fixed_fields_reuse_fitness_of_unchanged_individuals(self):
+        evolution = runSmallEvolution(6, fixedFieldCount=4, mutationRate=0.05, **self.budgetSettings)
+        simulated = evolution.individualsSimulated
+        evolution.nextGeneration()
+        self.assertGreater(evolution.fitnessesReused, 0)
+        self.assertLessEqual(evolution.individualsSimulated - simulated + evolution.fitnessesReused, 20*4)
+        for individual, fitness in zip(evolution.population, evolution.popFitness):
+            total = 0
+            for field, startingPosition, fieldId in evolution.fixedFields:
+                evolution.field, evolution.startingPosition = field, startingPosition
+                total += evolution.evaluateFitness(individual)
+            self.assertEqual(fitness, total)
+
+    def test_successiveHalving_with_one_round_matches_fixed_budget(self):
+        fixed = runSmallEvolution(6, **self.budgetSettings)
+        halving = runSmallEvolution(6, successiveHalving=True, halvingRounds=1, **self.budgetSettings)
+        self.assertEqual(halving.popFitness, fixed.popFitness)
+        self.assertEqual(halving.maxFitness, fixed.maxFitness)
+        self.assertEqual(halving.stepsSimulated, fixed.stepsSimulated)
+
+    def test_successiveHalving_gives_full_budget_to_fittest(self):
+        fixed = runSmallEvolution(6, **self.budgetSettings)
+        halving = runSmallEvolution(6, successiveHalving=True, **self.budgetSettings)
+        self.assertEqual(halving.individualsSimulated, 20*1 + 10*2 + 5*4)
+        self.assertLess(halving.stepsSimulated, fixed.stepsSimulated)
+        self.assertEqual(halving.evalMovements, fixed.evalMovements)
+        self.assertEqual(halving.evalsDone, 4)
+        for partial, full in zip(halving.popFitness, fixed.popFitness):
+            self.assertLessEqual(partial, full)
+        self.assertGreaterEqual(sum(1 for partial, full in zip(halving.popFitness, fixed.popFitness) if partial == full), 5)
+        self.assertEqual(halving.maxFitness, fixed.popFitness[halving.population.index(halving.bestIndividual)])
+        self.assertEqual(halving.maxFitness, max(halving.popFitness))
+
+    def test_successiveHalving_rejects_invalid_settings(self):
+        for settings in ({"halvingRounds": 0}, {"halvingKeepFraction": 0}, {"halvingKeepFraction": 1.5}):
+            with self.assertRaises(RuntimeError):
+                runSmallEvolution(6, successiveHalving=True, **settings, **self.budgetSettings)
+
+    def test_batchedSamples_matches_one_dispatch_per_field(self):
+        for settings in ({"threadCount": 1}, {"threadCount": 2}, {"threadCount": 2, "fitnessCache": None}):
+            results = []
+            for batchedSamples in (False, True):
+                evolution = runSmallEvolution(6, runGeneration, evalSample=3, batchedSamples=batchedSamples, **settings)
+                results.append((evolution.popFitness, evolution.maxFitness, evolution.population.index(evolution.bestIndividual), evolution.evalsDone))
+            self.assertEqual(results[1], results[0])
+
+    def test_evaluateOnFields_simulates_repeated_field_once(self):
+        evolution, individuals = createEvaluatedSamples(2)
+        sample = (evolution.field, evolution.startingPosition, evolution.fieldId)
+        results = evolution.evaluateOnFields(individuals, [sample, sample])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(evolution.individualsSimulated, len(set(evolution.getFitnessKey(individual) for individual in individuals)))
+
+    def test_stepsSimulated_counted_in_workers(self):
+        counts = [runSmallEvolution(1, threadCount=threadCount).stepsSimulated for threadCount in (1, 2)]
+        self.assertGreater(counts[0], 0)
+        self.assertEqual(counts[1], counts[0])
+
+    def test_trainHeadless_prints_best_individual(self):
+        options = parseArguments(["--headless", "--generations", "1", "--pop-size", "8", "--eval-sample", "2", "--eval-movements", "200", "--workers", "1", "--field-width", "240", "--field-height", "135", "--seed", "4"])
+        output = io.StringIO()
+        with contextlib.redirect_stderr(io.StringIO()) as log:
+            evolution = trainHeadless(options, output)
+        self.assertEqual(evolution.generation, 1)
+        self.assertEqual(log.getvalue().count("steps/s"), 2)
+        self.assertEqual(log.getvalue().count(" of 16 evaluations simulated"), 2)
+        self.assertEqual(StateMachine.fromJson(output.getvalue()), evolution.bestIndividual)
+
+    def test_trainHeadless_steady_state(self):
+        options = parseArguments(["--headless", "--steady-state", "--generations", "2", "--pop-size", "8", "--eval-sample", "2", "--eval-movements", "200", "--workers", "1", "--field-width", "240", "--field-height", "135", "--seed", "4"])
+        with contextlib.redirect_stderr(io.StringIO()):
+            evolution = trainHeadless(options, io.StringIO())
+        self.assertEqual(evolution.generation, 2)
+        self.assertEqual(evolution.offspringInserted, 16)
+
+    def test_parseArguments_headless_needs_a_limit(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parseArguments(["--headless"])
+
+    def test_import_does_not_load_visualizer_modules(self):
+        script = "import sys, ExplorerEvolution; print('pygame' in sys.modules, ExplorerEvolution.fitnessQueue is None)"
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        self.assertEqual(output.strip(), "False True")
+
+    def test_evaluatePopulation_persistent_pool_matches_single_thread(self):
+        expected = runSmallEvolution(1, threadCount=1).popFitness
+        self.assertEqual(runSmallEvolution(1, persistentWorkers=True).popFitness, expected)
+
+    def test_evaluatePopulation_work_unit_sizes_match_single_thread(self):
+        expected = runSmallEvolution(1, threadCount=1).popFitness
+        for workUnitSize in (0, 1, 5):
+            self.assertEqual(runSmallEvolution(1, workUnitSize=workUnitSize).popFitness, expected)
+
+    def test_evaluatePopulation_retries_after_worker_dies(self):
+        expected = runSmallEvolution(1, threadCount=1).popFitness
+        def initializeAfterWorkerDies(evolution):
+            evolution.getWorkerPool().submit(os._exit, 1)
+            evolution.initializePopulation()
+        evolution = runSmallEvolution(1, initializeAfterWorkerDies)
+        self.assertEqual(evolution.popFitness, expected)
+        self.assertGreaterEqual(evolution.workerFailures, 1)
+
+    def test_evaluatePopulation_records_worker_times(self):
+        evolution = runSmallEvolution(1, workUnitSize=2)
+        self.assertLessEqual(len(evolution.workerBusyTime), evolution.threadCount)
+        self.assertEqual(evolution.workerBusyTime.keys(), evolution.workerIdleTime.keys())
+        self.assertGreater(sum(evolution.workerBusyTime.values()), 0)
+        self.assertTrue(0 < evolution.getWorkerUtilization() <= 1)
+
+    def test_evaluatePopulation_shared_field_matches_single_thread(self):
+        expected = runSmallEvolution(1, threadCount=1).popFitness
+        self.assertEqual(runSmallEvolution(1, sharedFieldMemory=True, persistentWorkers=False).popFitness, expected)
+
+    def test_evaluateFitness_matches_reference(self):
+        for seed in range(3):
+            for shortcut in (True, False):
+                evolution, individuals = createEvaluatedSamples(seed, evaluationBlockedShortcut=shortcut)
+                for individual in individuals:
+                    self.assertEqual(evolution.evaluateFitness(individual), referenceFitness(evolution, individual))
+
+    def test_evaluateFitness_uses_changed_states_after_invalidate(self):
+        evolution, individuals = createEvaluatedSamples(4)
+        individual = individuals[0]
+        evolution.evaluateFitness(individual)
+        individual.statesDict[0] = State(0, 0, 0, -1, 3, 0)
+        individual.invalidate()
+        self.assertEqual(evolution.evaluateFitness(individual), referenceFitness(evolution, individual))
+
+    def test_evaluateFitness_cycle_detection_matches_full_run(self):
+        for seed in range(3):
+            for shortcut in (True, False):
+                evolution, individuals = createEvaluatedSamples(seed, evaluationBlockedShortcut=shortcut, evalMovements=2500)
+                for individual in individuals:
+                    evolution.cycleDetection = True
+                    fitness = evolution.evaluateFitness(individual)
+                    evolution.cycleDetection = False
+                    self.assertEqual(fitness, evolution.evaluateFitness(individual))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_evaluateFitnessLockstep_matches_evaluateFitness(self):
+        for seed in range(3):
+            for shortcut in (True, False):
+                evolution, individuals = createEvaluatedSamples(seed, count=30, evaluationBlockedShortcut=shortcut)
+                expected = [evolution.evaluateFitness(individual) for individual in individuals]
+                self.assertEqual(evolution.evaluateFitnessLockstep(individuals), expected)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_evaluatePopulation_numpy_simulator_matches_python(self):
+        expected = runSmallEvolution(1, threadCount=1).popFitness
+        self.assertEqual(runSmallEvolution(1, simulator="numpy").popFitness, expected)
+
+    def test_evaluateFitness_reuses_visited_cells(self):
+        evolution, individuals = createEvaluatedSamples(5, count=3)
+        expected = [referenceFitness(evolution, individual) for individual in individuals]
+        evolution.evaluateFitness(individuals[0])
+        visitedCells = evolution.visitedCells
+        for i in range(300): #enough evaluations for the marker to wrap around
+            self.assertEqual(evolution.evaluateFitness(individuals[i % 3]), expected[i % 3])
+        self.assertIs(evolution.visitedCells, visitedCells)
+
+    def test_evaluatePopulation_fitness_cache_matches_uncached(self):
+        expected = runSmallEvolution(1, threadCount=1, fitnessCache=None).popFitness
+        self.assertEqual(runSmallEvolution(1, threadCount=1).popFitness, expected)
+
+    def test_evaluateOnField_simulates_clones_once(self):
+        evolution, individuals = createEvaluatedSamples(6, count=4)
+        population = individuals + [individual.copyMachine() for individual in individuals]
+        fitnesses = evolution.evaluateOnField(population)
+        self.assertEqual(fitnesses[:4], fitnesses[4:])
+        self.assertEqual(len(evolution.fitnessCache), 4)
+        self.assertEqual(evolution.evaluateOnField(population), fitnesses)
+        self.assertEqual(evolution.fitnessCache.hits, 4)
+        self.assertEqual(evolution.individualsSimulated, 4)
+
+    def test_evaluatePopulation_pool_reused_across_samples(self):
+        pools = []
+        def runGenerationRecordingPools(evolution):
+            evolution.initializePopulation()
+            pools.append(evolution.workerPool)
+            evolution.nextGeneration()
+            pools.append(evolution.workerPool)
+        evolution = runSmallEvolution(2, runGenerationRecordingPools)
+        self.assertIsNotNone(pools[0])
+        self.assertIs(pools[1], pools[0])
+        self.assertIsNone(evolution.workerPool)
+
+
+class TestFieldMethods(unittest.TestCase):
+
+    def test_drawLine_connects_endpoints(self):
+        field = Field(40, 30, 0)
+        field.drawLine(Coordinate(3, 25), Coordinate(31, 4), 1, Coordinate(0, 0))
+        cells = [(x, y) for x, y, value in field.getFilledCells()]
+        self.assertIn((3, 25), cells)
+        self.assertIn((31, 4), cells)
+        self.assertEqual(len(cells), 29)
+
+    def test_drawLine_skips_points_off_field(self):
+        field = Field(10, 10, 0)
+        field.drawLine(Coordinate(-5, 5), Coordinate(14, 5), 1, Coordinate(0, 0))
+        self.assertEqual(field.getFilledCells(), [(x, 5, 1) for x in range(10)])
+
+    def test_fillPolygon_square(self):
+        field = Field(20, 20, 0)
+        field.fillPolygon([(2, 3), (10, 3), (10, 12), (2, 12)], 2)
+        self.assertEqual(field.getFilledCells(), [(x, y, 2) for x in range(2, 10) for y in range(3, 13)])
+
+    def test_generateRandomShape_border_encloses_fill(self):
+        random.seed(4)
+        for vertexCount in range(3, 9):
+            field = Field(100, 100, 0)
+            field.generateRandomShape(vertexCount, 40, Coordinate(50, 50), 1, 2)
+            for x, y, value in field.getFilledCells():
+                if value == 2:
+                    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                        self.assertNotEqual(field.grid[x + dx][y + dy], 0)
+
+    def test_generateField_with_polygons(self):
+        evolution = Evolution(0)
+        evolution.threadCount = 1
+        evolution.fieldObstacleMaxSides = 8
+        random.seed(2)
+        for i in range(5):
+            evolution.generateField()
+            self.assertEqual(evolution.field.getValueAtCoordinate(evolution.startingPosition), 0)
+
+
+class TestSteadyStateMethods(unittest.TestCase):
+
+    settings = {"evalSample": 2, "workUnitSize": 3}
+
+    def checkPopulation(self, evolution):
+        self.assertEqual(len(evolution.population), evolution.popSize)
+        self.assertEqual(len(evolution.popFitness), evolution.popSize)
+        self.assertEqual(evolution.maxFitness, max(evolution.popFitness))
+        self.assertTrue(any(individual is evolution.bestIndividual for individual in evolution.population))
+
+    def test_runSteadyState_single_process(self):
+        evolution = runSmallEvolution(12, threadCount=1, **self.settings)
+        bestFitness = evolution.maxFitness
+        evolution.runSteadyState(2*evolution.popSize)
+        self.assertEqual(evolution.offspringInserted, 2*evolution.popSize)
+        self.assertEqual(evolution.generation, 2)
+        self.assertGreaterEqual(evolution.maxFitness, bestFitness)
+        self.checkPopulation(evolution)
+
+    def test_runSteadyState_keeps_workers_busy_between_calls(self):
+        queued = []
+        def runSteadyStateTwice(evolution):
+            evolution.runSteadyState(evolution.popSize)
+            queued.append(len(evolution.offspringTasks))
+            evolution.runSteadyState(evolution.popSize)
+        evolution = runSmallEvolution(12, runSteadyStateTwice, threadCount=2, **self.settings)
+        self.assertGreater(queued[0], 0)
+        self.assertGreaterEqual(evolution.generation, 2)
+        self.checkPopulation(evolution)
+        self.assertEqual(len(evolution.offspringTasks), 0)
+
+    def test_evaluateOffspringTask_sums_fitness_over_fields(self):
+        evolution, offspring = createEvaluatedSamples(12, 4)
+        evaluators = []
+        for i in range(2):
+            evolution.generateField()
+            evaluators.append(evolution.getEvaluator())
+        fitnesses, steps = evaluateOffspringTask((evaluators, offspring))
+        self.assertEqual(fitnesses, [sum(referenceFitness(evaluator, child) for evaluator in evaluators) for child in offspring])
+        self.assertGreater(steps, 0)
+
+    def test_runSteadyState_generates_one_round_of_fields_per_popSize_offspring(self):
+        evolution = runSmallEvolution(12, lambda evolution: evolution.runSteadyState(2*evolution.popSize), threadCount=1, **self.settings)
+        self.assertEqual(evolution.fieldsGenerated, 3*evolution.evalSample) #the initial population and two rounds
+
+    def test_offspring_tasks_match_reference_fitness(self):
+        evolution = runSmallEvolution(12, threadCount=1, fitnessCache=None, **self.settings)
+        evolution.initializeOverselection()
+        task = evolution.createOffspringTask(4)
+        offspring = task[0]
+        self.assertEqual(sum(len(individuals) for s, evaluator, individuals in task[2]), 4*evolution.evalSample)
+        self.assertEqual(evolution.finishOffspringTask(task, evaluateWorkerTasks(task[2])), 4)
+        for child in offspring:
+            expected = 0
+            for evolution.field, evolution.startingPosition, fieldId in evolution.offspringSamples:
+                expected += referenceFitness(evolution, child)
+            for individual, fitness in zip(evolution.population, evolution.popFitness):
+                if individual is child:
+                    self.assertEqual(fitness, expected)
+
+    def test_runSteadyState_uses_fitnessCache_and_fixed_fields(self):
+        for threadCount in (1, 2):
+            evolution = runSmallEvolution(12, lambda evolution: evolution.runSteadyState(2*evolution.popSize), threadCount=threadCount, fixedFieldCount=2, **self.settings)
+            self.assertEqual(evolution.fieldsGenerated, evolution.evalSample)
+            self.assertGreater(evolution.fitnessesReused + evolution.fitnessCache.hits, 0)
+            self.assertLess(evolution.individualsSimulated, (evolution.popSize + evolution.offspringInserted)*evolution.evalSample)
+            self.checkPopulation(evolution)
+
+    def test_selectReplacement_spares_best_individual(self):
+        evolution = runSmallEvolution(12, threadCount=1, **self.settings)
+        for i in range(50):
+            self.assertIsNot(evolution.population[evolution.selectReplacement()], evolution.bestIndividual)
+
+
+class TestIslandModelMethods(unittest.TestCase):
+
+    def createIslandModel(self, islandCount):
+        model = IslandModel(islandCount, 8)
+        model.migrationInterval = 1
+        model.settings = {"fieldWidth": 240, "fieldHeight": 135, "evalMovements": 200, "evalSample": 1}
+        return model
+
+    def test_getNeighbours(self):
+        self.assertEqual(IslandModel.getNeighbours("ring", 3), [[1], [2], [0]])
+        self.assertEqual(IslandModel.getNeighbours("ring", 1), [[]])
+        self.assertEqual(IslandModel.getNeighbours("fullyConnected", 3), [[1, 2], [0, 2], [0, 1]])
+        self.assertEqual(IslandModel.getNeighbours("none", 2), [[], []])
+        self.assertRaises(RuntimeError, IslandModel.getNeighbours, "star", 2)
+
+    def test_receiveMigrants_keeps_best_individual(self):
+        evolution = runSmallEvolution(5, popSize=8, threadCount=1)
+        best = evolution.bestIndividual
+        migrants = evolution.getMigrants(2)
+        self.assertEqual(migrants[0][1], evolution.maxFitness)
+        self.assertEqual(StateMachine.fromBytes(migrants[0][0]).toJson(), best.toJson())
+        evolution.receiveMigrants([(m, 0) for m, fitness in migrants])
+        self.assertEqual(len(evolution.population), 8)
+        self.assertTrue(any(individual is best for individual in evolution.population))
+        evolution.receiveMigrants([(migrants[1][0], evolution.maxFitness + 1)])
+        self.assertEqual(evolution.bestIndividual.toJson(), StateMachine.fromBytes(migrants[1][0]).toJson())
+
+    def test_run_migrates_between_islands(self):
+        model = self.createIslandModel(2)
+        best = model.run(3, seed=4)
+        self.assertEqual([result[0] for result in model.islandResults], [0, 1])
+        for index, individual, fitness, simulated, steps, migrants, elapsed in model.islandResults:
+            self.assertEqual(migrants, 2*model.migrantCount)
+            self.assertGreater(simulated, 0)
+        self.assertEqual(model.maxFitness, max(result[2] for result in model.islandResults))
+        self.assertEqual(best.toJson(), max(model.islandResults, key=lambda result: result[2])[1].toJson())
+
+    def test_run_continues_without_island_that_exits(self):
+        model = self.createIslandModel(3)
+        model.topology = "fullyConnected"
+        model.islandSettings = {1: {"nextGeneration": exitIsland}} #island 1 exits before its first migration
+        with self.assertRaises(RuntimeError):
+            model.run(3, seed=4)
+        self.assertEqual([result[0] for result in model.islandResults], [0, 2])
+        for result in model.islandResults:
+            self.assertEqual(result[5], 2*model.migrantCount) #only from the island that didn't exit
+
+    def test_run_migrates_batches_larger_than_pipe_buffer(self):
+        model = self.createIslandModel(3)
+        model.topology = "fullyConnected"
+        model.migrantCount = 8
+        model.settings["maxStartingSize"] = 3000
+        model.run(2, seed=5)
+        self.assertGreater(max(len(result[1].toBytes()) for result in model.islandResults)*model.migrantCount, 65536) #a typical pipe buffer
+        for result in model.islandResults:
+            self.assertEqual(result[5], 2*model.migrantCount)
+
+    def test_run_is_repeatable_with_seed(self):
+        model = self.createIslandModel(2)
+        model.topology = "none"
+        first = model.run(2, seed=9)
+        self.assertEqual([result[5] for result in model.islandResults], [0, 0])
+        fitnesses = [result[2] for result in model.islandResults]
+        second = model.run(2, seed=9)
+        self.assertEqual([result[2] for result in model.islandResults], fitnesses)
+        self.assertEqual(first.toJson(), second.toJson())
+
+class TestRemoteWorkerMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.daemons = [WorkerDaemon() for i in range(0, 2)]
+        for daemon in self.daemons:
+            daemon.start()
+
+    def tearDown(self):
+        for daemon in self.daemons:
+            daemon.stop()
+
+    def getAddress(self, daemon):
+        return daemon.address[0] + ":" + str(daemon.address[1])
+
+    settings = {"popSize": 20, "threadCount": 1, "workUnitSize": 3, "fitnessCache": None}
+
+    def test_remote_evaluation_matches_local(self):
+        local = runSmallEvolution(8, remoteWorkers=None, **self.settings)
+        pool = RemoteWorkerPool([self.getAddress(daemon) for daemon in self.daemons])
+        remote = runSmallEvolution(8, remoteWorkers=pool, **self.settings)
+        self.assertEqual(remote.popFitness, local.popFitness)
+        self.assertEqual(remote.stepsSimulated, local.stepsSimulated)
+        self.assertEqual(remote.individualsSimulated, local.individualsSimulated)
+        self.assertEqual(sum(pool.tasksEvaluated.values()), 14)
+        self.assertEqual(pool.tasksEvaluatedLocally, 0)
+        self.assertEqual(len(pool.connections), 0)
+
+    def test_resends_fields_dropped_from_daemon_cache(self):
+        self.daemons[0].fieldCacheSize = 1
+        local = runSmallEvolution(8, remoteWorkers=None, **self.settings)
+        pool = RemoteWorkerPool([self.getAddress(self.daemons[0])])
+        pool.pipelineDepth = 8
+        remote = runSmallEvolution(8, remoteWorkers=pool, **self.settings)
+        self.assertEqual(remote.popFitness, local.popFitness)
+
+    def test_tolerates_unreachable_and_leaving_daemons(self):
+        local = runSmallEvolution(8, remoteWorkers=None, **self.settings)
+        #A daemon that accepts connections and then closes them, like a host leaving mid-generation
+        listener = socket.create_server(("127.0.0.1", 0))
+        def acceptAndClose():
+            for i in range(0, 2):
+                connection, address = listener.accept()
+                connection.recv(16)
+                connection.close()
+        thread = threading.Thread(target=acceptAndClose, daemon=True)
+        thread.start()
+        self.daemons[1].stop()
+        addresses = [self.getAddress(daemon) for daemon in self.daemons] + ["127.0.0.1:" + str(listener.getsockname()[1])]
+        pool = RemoteWorkerPool(addresses)
+        remote = runSmallEvolution(8, remoteWorkers=pool, **self.settings)
+        listener.close()
+        self.assertEqual(remote.popFitness, local.popFitness)
+        self.assertGreaterEqual(pool.workerFailures, 1)
+        self.assertEqual(list(pool.tasksEvaluated.keys()), [addresses[0]])
+
+    def test_evaluates_locally_without_daemons_and_uses_daemons_that_join(self):
+        self.daemons[0].stop()
+        address = self.getAddress(self.daemons[0])
+        pool = RemoteWorkerPool([address])
+        local = runSmallEvolution(8, remoteWorkers=None, **self.settings)
+        remote = runSmallEvolution(8, remoteWorkers=pool, **self.settings)
+        self.assertEqual(remote.popFitness, local.popFitness)
+        self.assertEqual(pool.tasksEvaluatedLocally, 14)
+        pool.addresses.append(self.getAddress(self.daemons[1]))
+        remote = runSmallEvolution(8, remoteWorkers=pool, **self.settings)
+        self.assertEqual(remote.popFitness, local.popFitness)
+        self.assertEqual(pool.tasksEvaluated[self.getAddress(self.daemons[1])], 14)
+
+    def test_trainHeadless_with_remote_workers(self):
+        arguments = ["--headless", "--generations", "1", "--pop-size", "8", "--eval-sample", "2", "--eval-movements", "200", "--workers", "1", "--field-width", "240", "--field-height", "135", "--seed", "4"]
+        with contextlib.redirect_stderr(io.StringIO()):
+            local = trainHeadless(parseArguments(arguments), io.StringIO())
+            remote = trainHeadless(parseArguments(arguments + ["--remote-workers", ",".join(self.getAddress(daemon) for daemon in self.daemons)]), io.StringIO())
+        self.assertEqual(remote.popFitness, local.popFitness)
+        self.assertGreater(sum(daemon.tasksEvaluated for daemon in self.daemons), 0)
+
+    def test_runSteadyState_with_remote_workers_matches_local(self):
+        results = []
+        for remoteWorkers in (None, RemoteWorkerPool([self.getAddress(daemon) for daemon in self.daemons])):
+            threadCount = 1 if remoteWorkers == None else 2 #remote workers replace the local worker pool
+            evolution = runSmallEvolution(8, lambda evolution: evolution.runSteadyState(evolution.popSize), threadCount=threadCount, workUnitSize=3, remoteWorkers=remoteWorkers)
+            self.assertEqual(evolution.workerPool, None)
+            results.append((evolution.popFitness, evolution.stepsSimulated))
+        self.assertEqual(results[1], results[0])
+        self.assertGreater(sum(daemon.tasksEvaluated for daemon in self.daemons), 0)
+
+    def test_failed_task_leaves_no_stale_answers(self):
+        evolution = runSmallEvolution(4, Evolution.generateField, threadCount=1)
+        individuals = [evolution.generateRandomIndividual() for i in range(16)]
+        evaluator = evolution.getEvaluator()
+        badEvaluator = evolution.getEvaluator()
+        badEvaluator.field = NumpyField(10, 10, 0)
+        badEvaluator.field.width = badEvaluator.field.height = 10**7 #far too large for the daemon to allocate
+        tasks = [(evaluator, individuals[i:i + 2]) for i in range(0, 16, 2)]
+        expected = [tuple(evaluateOffspringTask(([evaluator], chunk))) for evaluator, chunk in tasks]
+        pool = RemoteWorkerPool([self.getAddress(daemon) for daemon in self.daemons])
+        pool.pipelineDepth = 1 #the first daemon gets the bad task while the second has good tasks outstanding
+        with self.assertRaises(RuntimeError):
+            pool.evaluate([(badEvaluator, individuals[:2])] + tasks)
+        self.assertEqual(pool.evaluate(tasks), expected)
+        pool.close()
+
+    def test_encodeMachines_round_trip(self):
+        random.seed(2)
+        evolution = createSmallEvolution()
+        machines = [evolution.generateRandomIndividual() for i in range(0, 3)]
+        decoded = RemoteWorkerPool.decodeMachines(RemoteWorkerPool.encodeMachines(machines))
+        self.assertEqual([machine.toJson() for machine in decoded], [machine.toJson() for machine in machines])
+        self.assertEqual(RemoteWorkerPool.decodeFitnesses(RemoteWorkerPool.encodeFitnesses(([3, 0, 12], 40))), ([3, 0, 12], 40))
+
+class TestCheckpointMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.checkpoint")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_continues_identically(self):
+        evolution = runSmallEvolution(9, runGeneration, evalSample=2, threadCount=1)
+        checkpoint = evolution.toCheckpoint()
+        evolution.nextGeneration()
+        randomState = random.getstate()
+        resumed = Evolution.fromCheckpoint(checkpoint)
+        resumed.threadCount = 1
+        self.assertEqual(resumed.generation, 1)
+        resumed.nextGeneration()
+        self.assertEqual(resumed.popFitness, evolution.popFitness)
+        self.assertEqual(resumed.maxFitness, evolution.maxFitness)
+        self.assertEqual([individual.toBytes() for individual in resumed.population], [individual.toBytes() for individual in evolution.population])
+        self.assertEqual(random.getstate(), randomState)
+
+    def test_checkpoint_keeps_shared_individuals_shared(self):
+        evolution = runSmallEvolution(9, runGeneration, evalSample=2, threadCount=1)
+        resumed = Evolution.fromCheckpoint(evolution.toCheckpoint())
+        self.assertEqual(len(set(map(id, resumed.population))), len(set(map(id, evolution.population))))
+        self.assertIn(resumed.bestIndividual, resumed.population)
+
+    def test_saveCheckpoint_in_background(self):
+        evolution = runSmallEvolution(9, runGeneration, evalSample=2, threadCount=1)
+        evolution.saveCheckpoint(self.path, background=True)
+        evolution.waitForCheckpoint()
+        self.assertEqual(os.listdir(self.directory.name), ["run.checkpoint"])
+        self.assertEqual(Evolution.loadCheckpoint(self.path).popFitness, evolution.popFitness)
+
+    def test_fromCheckpoint_rejects_other_data(self):
+        with self.assertRaises(RuntimeError):
+            Evolution.fromCheckpoint(bytes(100))
+
+    def test_trainHeadless_resumes_from_checkpoint(self):
+        arguments = ["--headless", "--pop-size", "8", "--eval-sample", "2", "--eval-movements", "200", "--workers", "1", "--field-width", "240", "--field-height", "135", "--checkpoint", self.path]
+        with contextlib.redirect_stderr(io.StringIO()):
+            trainHeadless(parseArguments(arguments + ["--generations", "2", "--seed", "3"]), io.StringIO())
+            evolution = trainHeadless(parseArguments(arguments + ["--generations", "1", "--resume", self.path]), io.StringIO())
+        self.assertEqual(evolution.generation, 3)
+        self.assertEqual(Evolution.loadCheckpoint(self.path).generation, 3)
+
+
+class TestFitnessCacheMethods(unittest.TestCase):
+
+    def test_get_missing(self):
+        cache = FitnessCache(2)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.misses, 1)
+
+    def test_put_evicts_least_recently_used(self):
+        cache = FitnessCache(2)
+        cache.put("a", 1)
+        cache.put("b", 0)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+
+class TestSharedFieldMethods(unittest.TestCase):
+
+    def test_values_match_list_field(self):
+        field = Field(50, 30, 0)
+        sharedField = SharedField(50, 30, 0)
+        for f in (field, sharedField):
+            f.generateCircle(12, Coordinate(20, 10), 1, 2)
+            f.drawFieldBorder(1)
+        for x in range(50):
+            self.assertEqual(list(sharedField.grid[x]), field.grid[x])
+        self.assertEqual(sharedField.getValueAtCoordinate(Coordinate(20, 10)), 2)
+        self.assertIsNone(sharedField.getValueAtCoordinate(Coordinate(50, 10)))
+        sharedField.close()
+
+    def test_pickle_attaches_to_same_memory(self):
+        sharedField = SharedField(20, 10, 0)
+        data = pickle.dumps(sharedField)
+        self.assertLess(len(data), 200)
+        attached = pickle.loads(data)
+        attached.writeValueAtCoordinate(Coordinate(3, 4), Coordinate(0, 0), 2)
+        self.assertEqual(sharedField.getValueAtCoordinate(Coordinate(3, 4)), 2)
+        attached.close()
+        sharedField.close()
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestNumpyFieldMethods(unittest.TestCase):
+
+    def test_circles_match_list_field(self):
+        random.seed(3)
+        field = Field(120, 80, 0)
+        numpyField = NumpyField(120, 80, 0)
+        circles = [(random.randint(0, 40), Coordinate(random.randint(-20, 139), random.randint(-20, 99))) for i in range(40)]
+        circles.append((80, Coordinate(60, 40)))
+        for f in (field, numpyField):
+            for radius, center in circles:
+                f.generateCircle(radius, center, 1, 2)
+            f.drawFieldBorder(1)
+        for x in range(120):
+            self.assertEqual(list(numpyField.grid[x]), field.grid[x])
+
+    def test_polygons_match_list_field(self):
+        field = Field(120, 80, 0)
+        numpyField = NumpyField(120, 80, 0)
+        for f in (field, numpyField):
+            random.seed(6)
+            for i in range(20):
+                f.generateRandomShape(random.randint(3, 8), random.randint(5, 60), Coordinate(random.randint(-20, 139), random.randint(-20, 99)), 1, 2)
+        for x in range(120):
+            self.assertEqual(list(numpyField.grid[x]), field.grid[x])
+
+    def test_pickle_copies_values(self):
+        field = NumpyField(30, 20, 0)
+        field.generateCircle(6, Coordinate(12, 9), 1, 2)
+        copy = pickle.loads(pickle.dumps(field))
+        self.assertEqual(bytes(copy.cells), bytes(field.cells))
+        self.assertEqual(copy.grid[12][9], 2)
+
+    def test_evaluatePopulation_without_shared_memory_matches_single_thread(self):
+        results = [runSmallEvolution(1, threadCount=threadCount, sharedFieldMemory=False).popFitness for threadCount in (1, 2)]
+        self.assertEqual(results[1], results[0])
+
+    def test_getFilledCells_matches_list_field(self):
+        field = Field(30, 20, 0)
+        numpyField = NumpyField(30, 20, 0)
+        for f in (field, numpyField):
+            f.generateCircle(6, Coordinate(12, 9), 1, 2)
+        self.assertEqual(numpyField.getFilledCells(), field.getFilledCells())
+        self.assertIn((12, 9, 2), field.getFilledCells())
+
+    def test_generateField_matches_list_field(self):
+        evolution = Evolution(0)
+        evolution.threadCount = 1
+        random.seed(5)
+        evolution.generateField()
+        self.assertIsInstance(evolution.field, NumpyField)
+        numpyGrid = [list(column) for column in evolution.field.grid]
+        evolution.createField = lambda: Field(evolution.fieldWidth, evolution.fieldHeight, 0)
+        random.seed(5)
+        evolution.generateField()
+        self.assertEqual(numpyGrid, evolution.field.grid)
+
+
+class TestFieldCorpusMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "fields.corpus")
+        self.evolution = createSmallEvolution()
+        self.evolution.threadCount = 1
+
+    def tearDown(self):
+        FieldCorpus.loaded.clear()
+        self.directory.cleanup()
+
+    def test_create_matches_generateField(self):
+        corpus = self.evolution.createFieldCorpus(self.path, 3, seed=7)
+        self.assertEqual(len(corpus), 3)
+        random.seed(random.Random(7).getrandbits(64))
+        self.evolution.generateField()
+        self.assertEqual(corpus.getField(0).toBytes(), self.evolution.field.toBytes())
+        self.assertEqual(corpus.getStartingPosition(0), self.evolution.startingPosition)
+
+    def test_create_in_parallel_matches_single_process(self):
+        corpus = self.evolution.createFieldCorpus(self.path, 4, seed=3)
+        self.evolution.threadCount = 2
+        parallelCorpus = self.evolution.createFieldCorpus(self.path + "2", 4, seed=3)
+        for i in range(4):
+            self.assertEqual(parallelCorpus.getField(i).toBytes(), corpus.getField(i).toBytes())
+            self.assertEqual(parallelCorpus.getStartingPosition(i), corpus.getStartingPosition(i))
+
+    def test_pickle_sends_path_and_index(self):
+        corpus = self.evolution.createFieldCorpus(self.path, 2, seed=1)
+        field = corpus.getField(1)
+        data = pickle.dumps(field)
+        self.assertLess(len(data), 300)
+        self.assertEqual(pickle.loads(data).toBytes(), field.toBytes())
+
+    def test_corpus_rebuilt_at_same_path_is_loaded_again(self):
+        corpus = self.evolution.createFieldCorpus(self.path, 2, seed=1)
+        oldData = pickle.dumps(corpus.getField(1))
+        FieldCorpus.loaded.clear() #as in a worker process that loaded the old corpus
+        self.assertEqual(pickle.loads(oldData).toBytes(), corpus.getField(1).toBytes())
+        newCorpus = self.evolution.createFieldCorpus(self.path, 2, seed=2)
+        FieldCorpus.loaded[(self.path, corpus.corpusId)] = corpus
+        self.assertIsNot(FieldCorpus.load(self.path), corpus)
+        self.assertEqual(pickle.loads(pickle.dumps(newCorpus.getField(1))).toBytes(), newCorpus.getField(1).toBytes())
+        FieldCorpus.loaded.clear()
+        with self.assertRaises(RuntimeError): #the old corpus is gone, so its Fields can't be loaded
+            pickle.loads(oldData)
+
+    def test_open_rejects_other_files(self):
+        with open(self.path, "wb") as file:
+            file.write(bytes(100))
+        with self.assertRaises(RuntimeError):
+            FieldCorpus(self.path)
+
+    def test_evaluatePopulation_from_corpus(self):
+        corpus = self.evolution.createFieldCorpus(self.path, 5, seed=2)
+        fitnesses = []
+        for threadCount in (1, 2):
+            evolution = runSmallEvolution(8, fieldCorpus=corpus, threadCount=threadCount)
+            self.assertEqual(evolution.fieldId[0], corpus.corpusId)
+            self.assertEqual(evolution.fieldsGenerated, 0)
+            fitnesses.append(evolution.popFitness)
+        self.assertEqual(fitnesses[1], fitnesses[0])
+
+    def test_corpus_fitnesses_not_stored_on_individuals(self):
+        evolution = runSmallEvolution(8, fieldCorpus=self.evolution.createFieldCorpus(self.path, 5, seed=2), threadCount=1)
+        for individual in evolution.population:
+            self.assertEqual(individual.fieldFitness, {})
+
+
+class TestCalibrationMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.calibrationFile = Evolution.calibrationFile
+        Evolution.calibrationFile = os.path.join(self.directory.name, "calibration.json")
+
+    def tearDown(self):
+        Evolution.calibrationFile = self.calibrationFile
+        self.directory.cleanup()
+
+    def test_calibrate_saves_choice_for_new_evolutions(self):
+        evolution = createSmallEvolution(6)
+        evolution.evalSample = 1
+        choice = evolution.calibrate(threadCounts=(1, 2), workUnitSizes=(0, 2))
+        self.assertIn(choice, ((1, 0), (2, 0), (2, 2)))
+        self.assertEqual((evolution.threadCount, evolution.workUnitSize), choice)
+        newEvolution = Evolution(6)
+        self.assertEqual(newEvolution.workUnitSize, 20) #constructing an Evolution doesn't load the calibration
+        self.assertTrue(newEvolution.applyCalibration())
+        self.assertEqual((newEvolution.threadCount, newEvolution.workUnitSize), choice)
+
+    def test_createEvolutionFromOptions_applies_calibration(self):
+        Evolution.saveCalibration(3, 7)
+        evolution = createEvolutionFromOptions(parseArguments(["--pop-size", "6"]))
+        self.assertEqual((evolution.threadCount, evolution.workUnitSize), (3, 7))
+        evolution = createEvolutionFromOptions(parseArguments(["--pop-size", "6", "--workers", "2"]))
+        self.assertEqual((evolution.threadCount, evolution.workUnitSize), (2, 7))
+
+    def test_saveCalibration_keeps_other_hosts(self):
+        with open(Evolution.calibrationFile, "w") as file:
+            file.write('{"otherhost:64": {"threadCount": 64, "workUnitSize": 5}}')
+        Evolution.saveCalibration(3, 7)
+        self.assertEqual(Evolution.loadCalibration(), (3, 7))
+        with open(Evolution.calibrationFile) as file:
+            self.assertIn("otherhost:64", file.read())
+
+    def test_loadCalibration_ignores_unreadable_file(self):
+        self.assertIsNone(Evolution.loadCalibration())
+        with open(Evolution.calibrationFile, "w") as file:
+            file.write("not json")
+        self.assertIsNone(Evolution.loadCalibration())
+        self.assertEqual(Evolution(0).threadCount, 4)
+
+
 if __name__ == '__main__':
     unittest.main()